@@ -1,9 +1,18 @@
 from flask import Flask, render_template, request, jsonify
 import math
-import random
-import copy
+import numpy as np
 import os
-from collections import Counter
+import json
+import time
+import hashlib
+import secrets
+import threading
+import multiprocessing
+from types import MappingProxyType
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -12,6 +21,156 @@ app = Flask(
     template_folder=os.path.join(BASE_DIR, "templates")
 )
 
+# Simulation sizing
+DEFAULT_DRAWS = 300
+MAX_DRAWS = 20000
+DEFAULT_CHUNK = 100
+MAX_CHUNK_CELLS = 2_000_000   # cap on draws * options * criteria per chunk
+Z_95 = 1.96
+PROGRESS_TOP = 10             # options listed in each SSE progress event
+RANK_DETAIL_LIMIT = 200       # max simulated options for rank histograms / pairwise
+SKYLINE_SIGMAS = 3.0          # noise band treated as reachable on dynamic criteria
+STABILITY_GRID = 26           # weight sweep points per criterion (0%, 4%, ..., 100%)
+STABILITY_STEPS = 12          # bisection steps per bound (4% / 2**12 < 0.01%)
+REVERSAL_TOP = 3              # default top-k checked for rank reversal
+REVERSAL_LIMIT = 2000         # max removals checked, best-ranked non-winners first
+
+# Scoring methods: name -> DecisionEngine method taking topsis_matrix's
+# batched (matrix, weights, benefit, fixed) arguments and returning
+# (..., options) scores, higher is better
+METHODS = {
+    "topsis":    "topsis_scores",
+    "vikor":     "vikor_scores",
+    "wsm":       "wsm_scores",
+    "wpm":       "wpm_scores",
+    "promethee": "promethee_scores",
+}
+DEFAULT_METHOD = "topsis"
+VIKOR_V = 0.5                 # weight of group utility vs. individual regret
+CONSENSUS_RULES = ("borda", "copeland")
+DEFAULT_CONSENSUS = "borda"
+WEIGHT_MODELS = ("dirichlet", "smaa")
+WEIGHT_CONCENTRATION = 50.0   # Dirichlet alpha = concentration * ROC weights
+NOISE_MODELS = ("normal", "uniform", "triangular", "lognormal", "empirical")
+# Noise for dynamic criteria without a spec: Gaussian(0, 1) on the 1-9 rating
+# scale, clipped to the observed range instead for columns outside 1-9
+DEFAULT_NOISE = {"type": "normal", "sigma": 1.0, "clip": (1.0, 9.0)}
+
+# Process-pool simulation for very large decisions (draws * options * criteria)
+SIM_WORKERS = int(os.environ.get("SIM_WORKERS", os.cpu_count() or 1))
+PARALLEL_MIN_CELLS = int(os.environ.get("SIM_PARALLEL_MIN_CELLS", 50_000_000))
+
+# /analyze result cache
+CACHE_SIZE = int(os.environ.get("ANALYZE_CACHE_SIZE", 256))
+CACHE_TTL = float(os.environ.get("ANALYZE_CACHE_TTL", 3600))
+CACHE_BYTES = int(os.environ.get("ANALYZE_CACHE_BYTES", 128 * 2**20))   # all responses
+
+# What-if sessions, kept in process memory
+WHATIF_SESSIONS = int(os.environ.get("WHATIF_SESSIONS", 64))
+WHATIF_TTL = float(os.environ.get("WHATIF_TTL", 1800))
+WHATIF_MAX_CELLS = int(os.environ.get("WHATIF_MAX_CELLS", MAX_CHUNK_CELLS))
+WHATIF_MAX_BYTES = int(os.environ.get("WHATIF_MAX_BYTES", 512 * 2**20))   # all sessions
+
+
+@lru_cache(maxsize=256)
+def _roc_base_weights(n):
+    """ROC weights for n strictly ordered criteria, shared across requests."""
+    # w_i = (1/i + ... + 1/n) / n: one reverse cumulative harmonic sum
+    tail = np.cumsum(1.0 / np.arange(n, 0, -1))[::-1]
+    return tuple((tail / n).tolist())
+
+
+class DecisionProblem:
+    """
+    Struct-of-arrays form of one decision.
+
+    names:    option names, one per row of `values`
+    criteria: criterion dicts (id, name, type, dynamic, priority, tied, weight)
+    values:   (options, criteria) float64 matrix
+
+    The weight vector and the benefit/dynamic masks are derived once from
+    `criteria`, so the engine never looks values up per option and key.
+
+    A problem is read-only: names and ids are tuples, criteria are mapping
+    proxies and every array has its writeable flag cleared, so all engine
+    stages can share one instance without defensive copies. Stages that
+    need to perturb values work on their own copies.
+    """
+
+    __slots__ = ("names", "criteria", "values", "ids", "weights", "benefit", "dynamic")
+
+    def __init__(self, names, criteria, values):
+        self.names = tuple(names)
+        self.criteria = tuple(MappingProxyType(dict(c)) for c in criteria)
+        self.values = self._frozen(
+            np.array(values, dtype=np.float64).reshape(len(self.names), len(criteria))
+        )
+        self.ids = tuple(c['id'] for c in criteria)
+        self.weights = self._frozen(np.array([c['weight'] for c in criteria], dtype=np.float64))
+        self.benefit = self._frozen(np.array([c['type'] == "benefit" for c in criteria], dtype=bool))
+        self.dynamic = self._frozen(np.array([bool(c.get('dynamic')) for c in criteria], dtype=bool))
+
+    @staticmethod
+    def _frozen(array):
+        array.flags.writeable = False
+        return array
+
+    def __len__(self):
+        return len(self.names)
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError(f"DecisionProblem.{name} is read-only")
+        object.__setattr__(self, name, value)
+
+
+_pool = None
+_pool_failed = False
+_pool_lock = threading.Lock()
+
+
+def simulation_pool():
+    """
+    Persistent process pool shared by all requests, or None if disabled.
+
+    Workers come from a forkserver (spawn where that is missing), never
+    a fork of the threaded web process. If the pool can't be created,
+    e.g. on hosts without multiprocessing semaphores, the error is
+    raised once and the pool stays disabled for this process.
+    """
+    global _pool, _pool_failed
+    with _pool_lock:
+        if _pool is None and SIM_WORKERS > 1 and not _pool_failed:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            try:
+                _pool = ProcessPoolExecutor(max_workers=SIM_WORKERS, mp_context=context)
+            except Exception:
+                _pool_failed = True
+                raise
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _simulation_chunk(base, weights, benefit, dynamic, fixed, size, seed_seq, tally,
+                      method=DEFAULT_METHOD, weight_spec=None, noise=None,
+                      ensemble_spec=None, ensemble_tally=None):
+    """Process-pool entry point: one chunk of draws with its own seed stream."""
+    engine = DecisionEngine()
+    rng = np.random.default_rng(seed_seq)
+    wins = engine.run_chunk(base, weights, benefit, dynamic, fixed, size, rng, tally,
+                            method, weight_spec, noise, ensemble_spec, ensemble_tally)
+    return wins, tally, ensemble_tally
+
 
 class DecisionEngine:
 
@@ -34,11 +193,23 @@ class DecisionEngine:
 
     def calculate_roc_weights(self, n):
         """Standard ROC weights for strict priority order."""
-        weights = []
-        for i in range(1, n + 1):
-            w = sum(1 / j for j in range(i, n + 1)) / n
-            weights.append(w)
-        return weights
+        return list(_roc_base_weights(n))
+
+    def roc_weights_bulk(self, priorities):
+        """
+        Tied-aware ROC weights for a (participants, criteria) priority
+        array; each row matches calculate_roc_weights_with_ties.
+
+        A criterion's tie block starts after every criterion with a smaller
+        priority and spans its ties, so its weight is that slice of the
+        base ROC prefix sums divided by the block size.
+        """
+        priorities = np.asarray(priorities)
+        n = priorities.shape[-1]
+        prefix = np.concatenate([[0.0], np.cumsum(_roc_base_weights(n))])
+        before = (priorities[..., None, :] < priorities[..., :, None]).sum(axis=-1)
+        tied = (priorities[..., None, :] == priorities[..., :, None]).sum(axis=-1)
+        return (prefix[before + tied] - prefix[before]) / tied
 
     def calculate_roc_weights_with_ties(self, priorities):
         """
@@ -53,21 +224,20 @@ class DecisionEngine:
           - The third criterion gets ROC_weight_3 normally.
         """
         n = len(priorities)
-        base = self.calculate_roc_weights(n)
+        base = _roc_base_weights(n)
+
+        # Prefix sums let each tied block average its slots in O(1)
+        prefix = [0.0]
+        for w in base:
+            prefix.append(prefix[-1] + w)
 
-        sorted_unique = sorted(set(priorities))
         slot_cursor = 0
-        priority_to_slots = {}
-        for p in sorted_unique:
-            count = priorities.count(p)
-            priority_to_slots[p] = list(range(slot_cursor, slot_cursor + count))
+        priority_to_weight = {}
+        for p, count in sorted(Counter(priorities).items()):
+            block = prefix[slot_cursor + count] - prefix[slot_cursor]
+            priority_to_weight[p] = block / count
             slot_cursor += count
 
-        priority_to_weight = {
-            p: sum(base[s] for s in slots) / len(slots)
-            for p, slots in priority_to_slots.items()
-        }
-
         return [priority_to_weight[p] for p in priorities]
 
     def _to_float(self, v):
@@ -76,100 +246,1543 @@ class DecisionEngine:
         except:
             return float(self.qualitative_map.get(str(v).lower().strip(), 5))
 
-    def run_topsis(self, options, criteria):
-        norm = {}
-        for c in criteria:
-            cid = c['id']
-            sq = sum(o['values'][cid] ** 2 for o in options)
-            den = math.sqrt(sq) if sq > 0 else 1
-            for o in options:
-                norm.setdefault(o['name'], {})
-                norm[o['name']][cid] = (o['values'][cid] / den) * c['weight']
-
-        best = {}
-        worst = {}
-        for c in criteria:
-            cid = c['id']
-            vals = [norm[o['name']][cid] for o in options]
-            if c['type'] == "benefit":
-                best[cid] = max(vals)
-                worst[cid] = min(vals)
+    def topsis_matrix(self, matrix, weights, benefit, fixed=None):
+        """
+        Array-backed TOPSIS.
+
+        matrix:  (..., options, criteria) raw values; any leading axes are
+                 treated as independent problems sharing weights and mask.
+        weights: (criteria,) weight vector.
+        benefit: (criteria,) bool mask, True for benefit, False for cost.
+                 Both may carry leading axes instead, broadcasting against
+                 the (..., criteria) ideal vector, to stack problems with
+                 different weights.
+        fixed:   optional (k, criteria) rows that take part in normalization
+                 and the ideal/anti-ideal but are not scored themselves.
+
+        Returns (scores, ideal, anti_ideal, norm) where norm is the weighted
+        normalized matrix and ideal/anti_ideal are per-criterion vectors.
+        """
+        matrix = np.asarray(matrix, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        benefit = np.asarray(benefit, dtype=bool)
+
+        sq = np.einsum('...ij,...ij->...j', matrix, matrix)
+        if fixed is not None:
+            sq = sq + np.einsum('ij,ij->j', fixed, fixed)
+        den = np.sqrt(sq)
+        den = np.where(den > 0, den, 1.0)
+        norm = matrix / den[..., None, :] * weights[..., None, :]
+
+        col_max = norm.max(axis=-2)
+        col_min = norm.min(axis=-2)
+        if fixed is not None and len(fixed):
+            # Scaling by a positive denominator keeps each column's extremes
+            scale = weights / den
+            col_max = np.maximum(col_max, fixed.max(axis=0) * scale)
+            col_min = np.minimum(col_min, fixed.min(axis=0) * scale)
+        ideal = np.where(benefit, col_max, col_min)
+        anti_ideal = np.where(benefit, col_min, col_max)
+
+        d1 = np.sqrt(((norm - ideal[..., None, :]) ** 2).sum(axis=-1))
+        d2 = np.sqrt(((norm - anti_ideal[..., None, :]) ** 2).sum(axis=-1))
+        total = d1 + d2
+        scores = np.divide(d2, total, out=np.full_like(total, 0.5), where=total > 0)
+
+        return scores, ideal, anti_ideal, norm
+
+    def score_matrix(self, matrix, weights, benefit, fixed=None, method=DEFAULT_METHOD):
+        """Scores from the registered `method` (see METHODS), higher is better."""
+        try:
+            scorer = getattr(self, METHODS[method])
+        except KeyError:
+            raise ValueError(f"unknown method {method!r}") from None
+        return scorer(matrix, weights, benefit, fixed)
+
+    def topsis_distances(self, matrix, benefit):
+        """
+        Unweighted squared distances of every cell of (..., options,
+        criteria) to its column's ideal and anti-ideal. TOPSIS distances
+        are sqrt(dist @ weights ** 2), so these serve any weight vector.
+        """
+        den = np.sqrt(np.einsum('...ij,...ij->...j', matrix, matrix))
+        den = np.where(den > 0, den, 1.0)
+        unit = matrix / den[..., None, :]
+        col_max = unit.max(axis=-2, keepdims=True)
+        col_min = unit.min(axis=-2, keepdims=True)
+        ideal = np.where(benefit, col_max, col_min)
+        anti_ideal = np.where(benefit, col_min, col_max)
+        return (unit - ideal) ** 2, (unit - anti_ideal) ** 2
+
+    def topsis_closeness(self, near, far, weight_rows):
+        """
+        (options, weight rows) TOPSIS scores from `topsis_distances` of a
+        2-D matrix: two matrix products for every weight vector at once.
+        """
+        w2 = (weight_rows ** 2).T
+        d1 = np.sqrt(near @ w2)
+        d2 = np.sqrt(far @ w2)
+        total = d1 + d2
+        return np.divide(d2, total, out=np.full_like(total, 0.5), where=total > 0)
+
+    def topsis_scores(self, matrix, weights, benefit, fixed=None):
+        """Relative closeness to the ideal solution (see `topsis_matrix`)."""
+        return self.topsis_matrix(matrix, weights, benefit, fixed)[0]
+
+    def _method_inputs(self, matrix, weights, benefit, fixed):
+        """
+        Common set-up for the non-TOPSIS scorers: `fixed` rows appended
+        after the scored ones on every leading axis, and weights and benefit
+        shaped to broadcast per cell.
+        """
+        matrix = np.asarray(matrix, dtype=float)
+        if fixed is not None and len(fixed):
+            fixed = np.broadcast_to(fixed, matrix.shape[:-2] + fixed.shape)
+            matrix = np.concatenate([matrix, fixed], axis=-2)
+        weights = np.asarray(weights, dtype=float)[..., None, :]
+        benefit = np.asarray(benefit, dtype=bool)[..., None, :]
+        return matrix, weights, benefit
+
+    def _linear_scale(self, matrix, benefit):
+        """
+        Min-max normalization per column: 1 at the column's best value, 0 at
+        its worst; constant columns are 1 everywhere.
+        """
+        col_max = matrix.max(axis=-2, keepdims=True)
+        col_min = matrix.min(axis=-2, keepdims=True)
+        good = np.where(benefit, matrix - col_min, col_max - matrix)
+        span = np.broadcast_to(col_max - col_min, good.shape)
+        return np.divide(good, span, out=np.ones_like(good), where=span > 0)
+
+    def wsm_scores(self, matrix, weights, benefit, fixed=None, scale=None):
+        """
+        Weighted sum model over min-max normalized values. `scale` is an
+        optional precomputed `_linear_scale` of the same inputs.
+        """
+        n = np.shape(matrix)[-2]
+        matrix, weights, benefit = self._method_inputs(matrix, weights, benefit, fixed)
+        if scale is None:
+            scale = self._linear_scale(matrix, benefit)
+        scores = (scale * weights).sum(axis=-1)
+        return scores[..., :n]
+
+    def wpm_scores(self, matrix, weights, benefit, fixed=None):
+        """
+        Weighted product model: product of (value / column best) ** weight,
+        with best / value for cost criteria. Columns that reach zero or
+        below are shifted to start at 1 so every ratio is defined.
+        """
+        n = np.shape(matrix)[-2]
+        matrix, weights, benefit = self._method_inputs(matrix, weights, benefit, fixed)
+        col_min = matrix.min(axis=-2, keepdims=True)
+        shifted = matrix + np.where(col_min > 0, 0.0, 1.0 - col_min)
+        logs = np.log(shifted)
+        log_max = logs.max(axis=-2, keepdims=True)
+        log_min = logs.min(axis=-2, keepdims=True)
+        log_ratio = np.where(benefit, logs - log_max, log_min - logs)
+        scores = np.exp((log_ratio * weights).sum(axis=-1))
+        return scores[..., :n]
+
+    def vikor_scores(self, matrix, weights, benefit, fixed=None, scale=None):
+        """
+        VIKOR compromise ranking, returned as 1 - Q so higher is better.
+
+        S is the weighted sum and R the largest weighted term of each
+        option's normalized distance to the column best; Q blends both,
+        scaled across options, with VIKOR_V as the weight of S. `scale`
+        is as for `wsm_scores`.
+        """
+        n = np.shape(matrix)[-2]
+        matrix, weights, benefit = self._method_inputs(matrix, weights, benefit, fixed)
+        if scale is None:
+            scale = self._linear_scale(matrix, benefit)
+        regret = (1.0 - scale) * weights
+        utility = regret.sum(axis=-1)
+        worst = regret.max(axis=-1)
+
+        def scaled(x):
+            lo = x.min(axis=-1, keepdims=True)
+            span = np.broadcast_to(x.max(axis=-1, keepdims=True) - lo, x.shape)
+            return np.divide(x - lo, span, out=np.zeros_like(x), where=span > 0)
+
+        q = VIKOR_V * scaled(utility) + (1 - VIKOR_V) * scaled(worst)
+        return (1.0 - q)[..., :n]
+
+    def promethee_scores(self, matrix, weights, benefit, fixed=None):
+        """
+        PROMETHEE II net outranking flow with the usual preference function.
+
+        With a strict "better or not" preference per criterion, an option's
+        net flow on one column is (options it beats - options that beat
+        it) / (n - 1), so the pairwise step reduces to counting ties and
+        ranks in each sorted column: O(n log n) instead of O(n^2).
+        """
+        n = np.shape(matrix)[-2]
+        matrix, weights, benefit = self._method_inputs(matrix, weights, benefit, fixed)
+        rows = matrix.shape[-2]
+
+        order = np.argsort(matrix, axis=-2, kind='stable')
+        ranked = np.take_along_axis(matrix, order, axis=-2)
+        pos = np.arange(rows).reshape((rows, 1))
+        starts = np.ones(ranked.shape, dtype=bool)
+        starts[..., 1:, :] = ranked[..., 1:, :] != ranked[..., :-1, :]
+        ends = np.ones(ranked.shape, dtype=bool)
+        ends[..., :-1, :] = ranked[..., :-1, :] != ranked[..., 1:, :]
+        # Rows strictly below / above each sorted position's tie group
+        below = np.maximum.accumulate(np.where(starts, pos, 0), axis=-2)
+        last = np.flip(np.minimum.accumulate(
+            np.flip(np.where(ends, pos, rows - 1), axis=-2), axis=-2), axis=-2)
+        above = rows - 1 - last
+
+        net = np.empty(ranked.shape)
+        np.put_along_axis(net, order, (below - above).astype(float), axis=-2)
+        net = np.where(benefit, net, -net)
+        scores = (net * weights).sum(axis=-1) / max(rows - 1, 1)
+        return scores[..., :n]
+
+    def group_scores(self, problem, weights, method=DEFAULT_METHOD):
+        """
+        (options, participants) scores of `problem` under each row of a
+        (participants, criteria) weight array.
+
+        For TOPSIS the unweighted distances are computed once and every
+        participant is scored by two options x participants matrix
+        products; other methods score the weight rows as one batch.
+        """
+        if method == "topsis":
+            near, far = self.topsis_distances(problem.values, problem.benefit)
+            return self.topsis_closeness(near, far, weights)
+
+        scores = np.empty((len(weights), len(problem)))
+        step = max(1, MAX_CHUNK_CELLS // max(1, problem.values.size))
+        for lo in range(0, len(weights), step):
+            scores[lo:lo + step] = self.score_matrix(problem.values, weights[lo:lo + step],
+                                                     problem.benefit, method=method)
+        return scores.T
+
+    def method_scores(self, matrix, weights, benefit, methods):
+        """
+        Scores of several methods on the same (..., options, criteria) draws,
+        stacked as (methods, ..., options). Normalizations that methods
+        share are computed once.
+        """
+        scale = None
+        if {"wsm", "vikor"} & set(methods):
+            full, _, cell_benefit = self._method_inputs(matrix, weights, benefit, None)
+            scale = self._linear_scale(full, cell_benefit)
+
+        scores = []
+        for method in methods:
+            if method in ("wsm", "vikor"):
+                scorer = getattr(self, METHODS[method])
+                scores.append(scorer(matrix, weights, benefit, scale=scale))
             else:
-                best[cid] = min(vals)
-                worst[cid] = max(vals)
-
-        results = []
-        for o in options:
-            name = o['name']
-            d1 = math.sqrt(sum(
-                (norm[name][c['id']] - best[c['id']]) ** 2 for c in criteria
-            ))
-            d2 = math.sqrt(sum(
-                (norm[name][c['id']] - worst[c['id']]) ** 2 for c in criteria
-            ))
-            score = d2 / (d1 + d2) if d1 + d2 > 0 else 0.5
-            results.append({"name": name, "score": score})
-
-        return (
-            sorted(results, key=lambda x: x['score'], reverse=True),
-            best, worst, norm
-        )
+                scores.append(self.score_matrix(matrix, weights, benefit, method=method))
+        return np.stack(scores)
+
+    def consensus_scores(self, scores, rule=DEFAULT_CONSENSUS):
+        """
+        Aggregate (methods, ..., options) scores into one consensus score
+        per option and draw.
+
+        borda:    points n - 1 - rank summed over methods, scaled to [0, 1]
+        copeland: pairwise majority wins minus losses over the other
+                  options, scaled to [-1, 1]
+        """
+        n_methods, n = len(scores), scores.shape[-1]
+        ranks = self.rank_positions(scores)
+        if rule == "borda":
+            return (n - 1 - ranks).sum(axis=0) / (n_methods * max(n - 1, 1))
+        if rule != "copeland":
+            raise ValueError(f"unknown consensus rule {rule!r}")
 
-    def simulate(self, options, criteria):
-        counts = {o['name']: 0 for o in options}
-        for _ in range(300):
-            sim = []
-            for o in options:
-                vals = o['values'].copy()
-                for c in criteria:
-                    if c['dynamic']:
-                        vals[c['id']] = max(1, min(9, vals[c['id']] + random.gauss(0, 1)))
-                sim.append({"name": o['name'], "values": vals})
-            res, _, _, _ = self.run_topsis(sim, criteria)
-            counts[res[0]['name']] += 1
-
-        return sorted(
-            [{"name": n, "confidence": round(c / 3, 1)} for n, c in counts.items()],
-            key=lambda x: x['confidence'], reverse=True
+        ranks = np.moveaxis(ranks, 0, -1)
+        flat = ranks.reshape(-1, n, n_methods)
+        out = np.empty(flat.shape[:2])
+        # Blocks of draws and of options a keep each (draws, a, b, methods)
+        # comparison within MAX_CHUNK_CELLS, however many options there are
+        pair_cells = n * n_methods
+        block = max(1, min(n, MAX_CHUNK_CELLS // pair_cells))
+        step = max(1, MAX_CHUNK_CELLS // (block * pair_cells))
+        for lo in range(0, len(flat), step):
+            r = flat[lo:lo + step]
+            for a in range(0, n, block):
+                rows = r[:, a:a + block, None, :]
+                # ahead[d, a, b] / behind[d, a, b]: methods ranking a above / below b
+                ahead = (rows < r[:, None, :, :]).sum(axis=-1)
+                behind = (rows > r[:, None, :, :]).sum(axis=-1)
+                out[lo:lo + step, a:a + block] = (np.sign(ahead - behind).sum(axis=-1)
+                                                  / max(n - 1, 1))
+        return out.reshape(ranks.shape[:-1])
+
+    def run_topsis(self, problem):
+        """
+        TOPSIS ranking of a DecisionProblem.
+
+        Returns (results, best, worst, norm): results sorted by score,
+        best/worst keyed by criterion id, norm the weighted normalized
+        matrix with rows in problem order.
+        """
+        scores, ideal, anti_ideal, norm = self.topsis_matrix(
+            problem.values, problem.weights, problem.benefit
         )
 
-    def explain_all(self, options, criteria):
-        results, _, _, norm = self.run_topsis(options, criteria)
-
-        ideal_raw = {}
-        worst_raw = {}
-        for c in criteria:
-            cid = c['id']
-            raw_vals = [o['values'][cid] for o in options]
-            if c['type'] == 'benefit':
-                ideal_raw[cid] = max(raw_vals)
-                worst_raw[cid] = min(raw_vals)
+        best = dict(zip(problem.ids, ideal.tolist()))
+        worst = dict(zip(problem.ids, anti_ideal.tolist()))
+
+        # Stable sort keeps input order among equal scores
+        order = np.argsort(-scores, kind='stable')
+        results = [
+            {"name": problem.names[i], "score": float(scores[i])}
+            for i in order
+        ]
+
+        return results, best, worst, norm
+
+    def skyline(self, matrix, benefit, dynamic, sigmas=SKYLINE_SIGMAS, noise=None):
+        """
+        Sort-filter-skyline over the options of `matrix`.
+
+        Option A dominates B when A is at least as good on every criterion
+        and strictly better on one. Dynamic criteria are compared by their
+        reachable band under the `noise` plan (see `noise_plan`; default
+        Gaussian(0, 1) clipped to [1, 9]): +/- `sigmas` standard deviations
+        for normal and lognormal noise, the full support otherwise. A
+        dominated option can then only win a simulation draw with
+        negligible probability.
+
+        Returns a bool mask, True for options on the Pareto front.
+        """
+        matrix = np.asarray(matrix, dtype=float)
+        # Every noise model is monotone in its normal / uniform draw, so the
+        # band's ends come from the extreme draws
+        cells = matrix[:, dynamic]
+        reach = np.full(cells.shape, float(sigmas))
+        down = self.apply_noise(noise, cells, -reach, np.zeros_like(cells))
+        up = self.apply_noise(noise, cells, reach, np.full(cells.shape, np.nextafter(1.0, 0.0)))
+        low, high = matrix.copy(), matrix.copy()
+        low[:, dynamic] = np.minimum(down, up)
+        high[:, dynamic] = np.maximum(down, up)
+
+        # Orient as "goodness": worst reachable and best reachable per cell
+        good_lo = np.where(benefit, low, -high)
+        good_hi = np.where(benefit, high, -low)
+
+        # A dominator always has a larger worst-case sum, so it is seen first.
+        # Candidates are checked a block at a time against the window of
+        # front options found so far and against each other; dominance is
+        # transitive, so being beaten by any earlier block member suffices.
+        order = np.argsort(-good_lo.sum(axis=1), kind='stable')
+        front = np.zeros(len(matrix), dtype=bool)
+        window = np.empty((0, matrix.shape[1]))
+        block = max(1, MAX_CHUNK_CELLS // max(1, matrix.size))
+        block = min(block, 256)
+        for start in range(0, len(order), block):
+            idx = order[start:start + block]
+            cand_hi = good_hi[idx]
+            beaten = self._dominates(window, cand_hi).any(axis=0)
+            beaten |= self._dominates(good_lo[idx], cand_hi).any(axis=0)
+            keep = idx[~beaten]
+            front[keep] = True
+            window = np.concatenate([window, good_lo[keep]])
+        return front
+
+    def _dominates(self, good_lo, good_hi):
+        """(a, b) mask: row a's worst case beats row b's best case."""
+        # One 2-D comparison per criterion avoids an (a, b, criteria) temporary
+        ge = np.ones((len(good_lo), len(good_hi)), dtype=bool)
+        gt = np.zeros_like(ge)
+        for j in range(good_hi.shape[1]):
+            lo = good_lo[:, j, None]
+            hi = good_hi[None, :, j]
+            ge &= lo >= hi
+            gt |= lo > hi
+        return ge & gt
+
+    def wilson_margin(self, wins, n, z=Z_95):
+        """Half-width of the Wilson score interval for wins out of n."""
+        if n == 0:
+            return 1.0
+        p = wins / n
+        z2 = z * z
+        return z * math.sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / (1 + z2 / n)
+
+    def seed_sequence(self, seed=None):
+        """
+        Root of the simulation's RNG streams.
+
+        A fresh seed is drawn when none is given, so every run can be
+        replayed later from the seed reported alongside its results. It is
+        kept below 2**53 so it survives a round trip through JavaScript.
+        """
+        if isinstance(seed, np.random.SeedSequence):
+            return seed
+        if seed is None:
+            seed = int(np.random.default_rng().integers(2 ** 53))
+        return np.random.SeedSequence(seed)
+
+    def spawn_rngs(self, seed_seq, n):
+        """Independent child Generators, e.g. one per simulation chunk."""
+        return [np.random.default_rng(s) for s in seed_seq.spawn(n)]
+
+    def rank_positions(self, scores):
+        """0-based rank of every option in each draw of a (..., options) array."""
+        order = np.argsort(-scores, axis=-1, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(scores.shape[-1]), axis=-1)
+        return ranks
+
+    def _tally_ranks(self, tally, scores, repeat=1):
+        """Add one chunk of (draws, options) scores to a rank tally."""
+        n = scores.shape[-1]
+        ranks = self.rank_positions(scores).reshape(-1, n)
+        tally['sum'] += ranks.sum(axis=0) * repeat
+        if tally['hist'] is None:
+            return
+
+        cells = (np.arange(n) * n + ranks).ravel()
+        tally['hist'] += np.bincount(cells, minlength=n * n).reshape(n, n) * repeat
+
+        # beats[a, b]: draws where a ranked ahead of b, batched to bound memory
+        step = max(1, MAX_CHUNK_CELLS // (n * n))
+        for start in range(0, len(ranks), step):
+            r = ranks[start:start + step]
+            tally['beats'] += (r[:, :, None] < r[:, None, :]).sum(axis=0) * repeat
+
+    def new_tally(self, n, detailed):
+        """Empty rank tally for n simulated options (see `_tally_ranks`)."""
+        return {
+            "sum":   np.zeros(n, dtype=np.int64),
+            "hist":  np.zeros((n, n), dtype=np.int64) if detailed else None,
+            "beats": np.zeros((n, n), dtype=np.int64) if detailed else None,
+        }
+
+    def new_ensemble_tally(self, n_methods, n):
+        """Empty ensemble tally for n options (see `_tally_ensemble`)."""
+        return {
+            "wins":           np.zeros((n_methods, n), dtype=np.int64),
+            "consensus_wins": np.zeros(n, dtype=np.int64),
+            "consensus_sum":  np.zeros(n),
+        }
+
+    def _tally_ensemble(self, tally, scores, rule, repeat=1):
+        """
+        Add one chunk of (methods, draws, options) scores to an ensemble
+        tally: draws won under each method and on the consensus score, and
+        the consensus score summed over draws.
+        """
+        n = scores.shape[-1]
+        consensus = self.consensus_scores(scores, rule)
+        for row, method_scores in zip(tally['wins'], scores):
+            row += np.bincount(method_scores.argmax(axis=-1), minlength=n) * repeat
+        tally['consensus_wins'] += np.bincount(consensus.argmax(axis=-1), minlength=n) * repeat
+        tally['consensus_sum'] += consensus.sum(axis=0) * repeat
+
+    def merge_tally(self, into, part):
+        for key, value in part.items():
+            if value is not None:
+                into[key] += value
+
+    def noise_plan(self, problem):
+        """
+        Noise model arrays for the dynamic criteria of `problem`, in column
+        order, from each criterion's "noise" spec (see `parse_noise`).
+
+        Criteria without a spec use DEFAULT_NOISE, clipped to the observed
+        range when some value falls outside [1, 9] (prices, latencies, ...).
+        A spec's "clip" range defaults to the range of values observed
+        across options.
+        """
+        cols = np.flatnonzero(problem.dynamic)
+        kinds = []
+        a, b, c = np.zeros(len(cols)), np.zeros(len(cols)), np.zeros(len(cols))
+        lo, hi = np.full(len(cols), -np.inf), np.full(len(cols), np.inf)
+        support = [None] * len(cols)
+        for i, j in enumerate(cols.tolist()):
+            spec = problem.criteria[j].get('noise') or DEFAULT_NOISE
+            kind = spec['type']
+            kinds.append(kind)
+            if kind in ("normal", "lognormal"):
+                a[i] = spec['sigma']
+            elif kind in ("uniform", "triangular"):
+                a[i], b[i], c[i] = spec['low'], spec['high'], spec.get('mode', 0.0)
             else:
-                ideal_raw[cid] = min(raw_vals)
-                worst_raw[cid] = max(raw_vals)
-
-        all_explanations = {}
-        for o in options:
-            name = o['name']
-            explanation = []
-            for c in criteria:
-                cid = c['id']
-                actual = o['values'][cid]
-                ideal_val = ideal_raw[cid]
-                worst_val = worst_raw[cid]
-                raw_range = abs(ideal_val - worst_val)
-                gap_pct = abs(actual - ideal_val) / raw_range * 100 if raw_range > 0 else 0.0
-                explanation.append({
-                    "id":      cid,
-                    "name":    c['name'],
-                    "actual":  actual,
-                    "gap_pct": round(gap_pct, 1),
-                    "weight":  c['weight'],
-                })
-            explanation.sort(key=lambda x: x['gap_pct'])
-            all_explanations[name] = explanation
+                order = np.argsort(spec['values'], kind='stable')
+                probs = np.asarray(spec['weights'], dtype=float)[order]
+                support[i] = (np.asarray(spec['values'], dtype=float)[order],
+                              np.cumsum(probs) / probs.sum())
+
+            clip = spec['clip']
+            column = problem.values[:, j]
+            if spec is DEFAULT_NOISE and len(problem) and (column.min() < 1 or column.max() > 9):
+                clip = "observed"
+            if clip == "observed" and len(problem):
+                lo[i], hi[i] = column.min(), column.max()
+            elif clip not in (None, "observed"):
+                lo[i], hi[i] = clip
+
+        kinds = np.array(kinds, dtype=str)
+        return {
+            "kind":    kinds,
+            "a":       a,
+            "b":       b,
+            "c":       c,
+            "support": support,
+            "lo":      lo,
+            "hi":      hi,
+            "uniform": bool(np.isin(kinds, ("uniform", "triangular", "empirical")).any()),
+        }
+
+    def noise_draws(self, noise, size, n_opts, n_dyn, rng):
+        """
+        Raw (size, options, dynamic criteria) draws for `apply_noise`: a
+        standard normal block and, only if some model needs one, a uniform
+        block. Default noise therefore consumes the generator exactly as
+        plain Gaussian noise does.
+        """
+        z = rng.standard_normal((size, n_opts, n_dyn))
+        u = rng.random((size, n_opts, n_dyn)) if noise is not None and noise['uniform'] else None
+        return z, u
+
+    def apply_noise(self, noise, values, z, u, cols=None):
+        """
+        Perturb (..., dynamic criteria) `values` with raw draws `z`/`u`
+        under a `noise_plan`, then clip to each criterion's range. `cols`
+        selects plan columns when only some are passed in. Without a plan
+        this is Gaussian(0, 1) noise clipped to [1, 9].
+
+        Each noise model is applied to all of its columns at once;
+        empirical columns have different supports and go one by one.
+        """
+        if noise is None:
+            return np.clip(values + z, 1, 9)
+
+        idx = np.arange(len(noise['kind'])) if cols is None else np.asarray(cols)
+        kinds = noise['kind'][idx]
+        a, b, c = noise['a'][idx], noise['b'][idx], noise['c'][idx]
+        out = np.empty(np.broadcast_shapes(np.shape(values), np.shape(z)))
+        for kind in np.unique(kinds).tolist():
+            sel = np.flatnonzero(kinds == kind)
+            v = values[..., sel]
+            if kind == "normal":
+                out[..., sel] = v + z[..., sel] * a[sel]
+            elif kind == "lognormal":
+                out[..., sel] = v * np.exp(z[..., sel] * a[sel])
+            elif kind == "uniform":
+                out[..., sel] = v + a[sel] + u[..., sel] * (b[sel] - a[sel])
+            elif kind == "triangular":
+                low, high, mode, q = a[sel], b[sel], c[sel], u[..., sel]
+                span = high - low
+                split = np.divide(mode - low, span, out=np.zeros_like(span), where=span > 0)
+                left = low + np.sqrt(q * span * (mode - low))
+                right = high - np.sqrt((1 - q) * span * (high - mode))
+                out[..., sel] = v + np.where(q < split, left, right)
+            else:
+                for t, col in zip(sel.tolist(), idx[sel].tolist()):
+                    offsets, cum = noise['support'][col]
+                    pick = np.searchsorted(cum, u[..., t], side='right')
+                    out[..., t] = values[..., t] + offsets[np.minimum(pick, len(offsets) - 1)]
+        return np.clip(out, noise['lo'][idx], noise['hi'][idx])
+
+    def perturb(self, base, dynamic, size, rng, noise=None):
+        """
+        (size, options, criteria) draws of `base` with noise on the dynamic
+        columns under the `noise` plan (default Gaussian(0, 1) in [1, 9]).
+        """
+        tensor = np.broadcast_to(base, (size,) + base.shape).copy()
+        z, u = self.noise_draws(noise, size, base.shape[0], int(dynamic.sum()), rng)
+        tensor[..., dynamic] = self.apply_noise(noise, tensor[..., dynamic], z, u)
+        return tensor
+
+    def sample_weights(self, spec, size, rng):
+        """
+        (size, criteria) weight draws for weight-uncertainty simulations.
+
+        spec["model"] is "dirichlet" for Dirichlet draws centred on the ROC
+        weights, with alpha = concentration * weights, or "smaa" for uniform
+        draws over the weight vectors consistent with the priority order
+        (higher priority, larger weight; tied criteria in any order). The
+        ROC weights are the centroid of that region.
+        """
+        if spec['model'] == "dirichlet":
+            return rng.dirichlet(spec['concentration'] * spec['weights'], size)
+
+        priorities = spec['priorities']
+        # Sorted uniform simplex points, handed out in priority order; the
+        # random fraction only reorders criteria that share a priority
+        spread = rng.standard_exponential((size, len(priorities)))
+        ranked = -np.sort(-spread / spread.sum(axis=1, keepdims=True), axis=1)
+        order = np.argsort(priorities + rng.random((size, len(priorities))) * 0.5, axis=1)
+        weights = np.empty_like(ranked)
+        np.put_along_axis(weights, order, ranked, axis=1)
+        return weights
+
+    def run_chunk(self, base, weights, benefit, dynamic, fixed, size, rng, tally=None,
+                  method=DEFAULT_METHOD, weight_spec=None, noise=None,
+                  ensemble_spec=None, ensemble_tally=None):
+        """
+        Score `size` perturbed draws of `base` and return how many each row
+        won; the rank tally, if given, is updated in place. With a
+        `weight_spec`, every draw also gets its own weight vector. With an
+        `ensemble_spec`, the same draws are also scored by its methods
+        (sharing their normalizations with `method`) into `ensemble_tally`.
+        """
+        tensor = self.perturb(base, dynamic, size, rng, noise)
+        if weight_spec is not None:
+            weights = self.sample_weights(weight_spec, size, rng)
+        if ensemble_spec is None:
+            scores = self.score_matrix(tensor, weights, benefit, fixed, method)
+        else:
+            methods = list(ensemble_spec['methods'])
+            if method not in methods:
+                methods.append(method)
+            stacked = self.method_scores(tensor, weights, benefit, methods)
+            scores = stacked[methods.index(method)]
+            self._tally_ensemble(ensemble_tally, stacked[:len(ensemble_spec['methods'])],
+                                 ensemble_spec['rule'])
+        if tally is not None:
+            self._tally_ranks(tally, scores)
+        # argmax takes the first maximum, matching the stable sort in run_topsis
+        return np.bincount(scores.argmax(axis=-1), minlength=base.shape[0])
+
+    def run_wave(self, chunks, base, weights, benefit, dynamic, fixed, detailed,
+                 method=DEFAULT_METHOD, weight_spec=None, noise=None, ensemble_spec=None):
+        """
+        Run a list of (size, seed_seq) chunks, on the process pool when there
+        is more than one, and return (wins, tally, ensemble tally) merged
+        over all of them. Chunks own their seed streams, so results don't
+        depend on where they ran; if the pool is unavailable they run here
+        instead.
+        """
+        n = base.shape[0]
+        wins = np.zeros(n, dtype=np.int64)
+        tally = self.new_tally(n, detailed) if detailed is not None else None
+        n_methods = len(ensemble_spec['methods']) if ensemble_spec is not None else 0
+        ensemble_tally = self.new_ensemble_tally(n_methods, n) if n_methods else None
+
+        parts = None
+        pool = None
+        if len(chunks) > 1:
+            try:
+                pool = simulation_pool()
+            except (OSError, NotImplementedError):
+                # Unsupported on this host (e.g. no semaphores); simulation_pool
+                # remembers that, so later waves go straight to the serial path
+                pool = None
+        if pool is not None:
+            try:
+                futures = [
+                    pool.submit(_simulation_chunk, base, weights, benefit, dynamic, fixed,
+                                size, ss, self.new_tally(n, detailed) if tally else None,
+                                method, weight_spec, noise, ensemble_spec,
+                                self.new_ensemble_tally(n_methods, n) if n_methods else None)
+                    for size, ss in chunks
+                ]
+                parts = [f.result() for f in futures]
+            except BrokenProcessPool:
+                # A worker died; replace the pool next time and run this wave here.
+                # Errors raised by the chunks themselves propagate as usual
+                _discard_pool()
+                parts = None
+        if parts is None:
+            parts = []
+            for size, ss in chunks:
+                part = self.new_tally(n, detailed) if tally else None
+                votes = self.new_ensemble_tally(n_methods, n) if n_methods else None
+                parts.append((self.run_chunk(base, weights, benefit, dynamic, fixed,
+                                             size, np.random.default_rng(ss), part,
+                                             method, weight_spec, noise,
+                                             ensemble_spec, votes), part, votes))
+
+        for part_wins, part_tally, part_votes in parts:
+            wins += part_wins
+            if tally is not None:
+                self.merge_tally(tally, part_tally)
+            if ensemble_tally is not None:
+                self.merge_tally(ensemble_tally, part_votes)
+        return wins, tally, ensemble_tally
+
+    def simulate_chunks(self, problem, draws=DEFAULT_DRAWS,
+                        precision=None, chunk_size=DEFAULT_CHUNK, seed=None,
+                        front=None, rank_stats=False, method=DEFAULT_METHOD,
+                        weight_model=None, concentration=WEIGHT_CONCENTRATION,
+                        ensemble=None, consensus=DEFAULT_CONSENSUS):
+        """
+        Run the Monte Carlo in chunks, yielding progress after each one.
+
+        Each chunk perturbs the dynamic columns of a (chunk, options, criteria)
+        tensor with each criterion's noise model (see `noise_plan`; by
+        default Gaussian(0, 1) clipped to [1, 9]) and scores every draw in
+        one batched pass of the scoring `method` (see METHODS).
+        `draws` is the total budget; if `precision` is given the run stops
+        early once the Wilson 95% interval on the leader's win rate is
+        within +/- precision (a fraction, e.g. 0.01).
+
+        With a `weight_model` ("dirichlet" or "smaa", see `sample_weights`)
+        each draw also samples its own weight vector, drawn from the same
+        chunk stream right after the value noise and scored in the same
+        batched pass.
+
+        Every chunk draws from its own child stream of `seed`, so a run is
+        reproducible and chunks don't depend on each other's RNG state.
+
+        `front` is an optional bool mask from `skyline`: only those options
+        are simulated, the rest are held at their (clipped) base values and
+        only feed the normalization and ideal/anti-ideal of each draw.
+
+        With `rank_stats`, each progress update also carries a rank tally
+        over the simulated options (all of them unless `front` is given):
+        rank sums for the expected rank and,
+        up to RANK_DETAIL_LIMIT options, an options x ranks histogram and a
+        pairwise "row beats column" count matrix.
+
+        With a list of `ensemble` methods, each chunk's draws are also scored
+        by those methods and ranked by the `consensus` rule (see
+        `consensus_scores`), and progress carries an ensemble tally (see
+        `_tally_ensemble`) over exactly the draws behind `counts`. This needs
+        every option simulated with fixed weights.
+
+        When draws x options x criteria reaches PARALLEL_MIN_CELLS, chunks
+        are dispatched in waves of SIM_WORKERS to the process pool and
+        progress is reported per wave. Chunk seeds are spawned in the same
+        order either way, so parallel and serial runs give equal results.
+        """
+        matrix = problem.values
+        weights, benefit, dynamic = problem.weights, problem.benefit, problem.dynamic
+        n_opts = matrix.shape[0]
+        n_dyn = int(dynamic.sum())
+        seed_seq = self.seed_sequence(seed)
+        noise = self.noise_plan(problem)
+
+        if front is None:
+            index = np.arange(n_opts)
+            base, fixed = matrix, None
+        else:
+            index = np.flatnonzero(front)
+            base = matrix[index]
+            fixed = matrix[~front]
+            fixed[:, dynamic] = np.clip(fixed[:, dynamic], noise['lo'], noise['hi'])
+
+        weight_spec = None
+        if weight_model is not None:
+            weight_spec = {
+                "model":         weight_model,
+                "weights":       weights,
+                "priorities":    np.array([c['priority'] for c in problem.criteria]),
+                "concentration": concentration,
+            }
+
+        ensemble_spec = ensemble_tally = None
+        if ensemble:
+            if front is not None or weight_spec is not None:
+                raise ValueError("an ensemble needs every option simulated with fixed weights")
+            ensemble_spec = {"methods": list(ensemble), "rule": consensus}
+            ensemble_tally = self.new_ensemble_tally(len(ensemble), n_opts)
+
+        counts = np.zeros(n_opts, dtype=np.int64)
+        tally = detailed = None
+        if rank_stats:
+            detailed = len(index) <= RANK_DETAIL_LIMIT
+            tally = self.new_tally(len(index), detailed)
+
+        if not n_dyn and weight_spec is None:
+            # Nothing is perturbed, so every draw has the same winner
+            scores = self.score_matrix(matrix, weights, benefit, method=method)
+            counts[scores.argmax()] = draws
+            if tally is not None:
+                self._tally_ranks(tally, scores[index][None, :], repeat=draws)
+            if ensemble_tally is not None:
+                self._tally_ensemble(ensemble_tally,
+                                     self.method_scores(matrix[None], weights, benefit, ensemble),
+                                     consensus, repeat=draws)
+            yield {"draws": draws, "counts": counts, "margin": 0.0, "ranks": tally,
+                   "ensemble": ensemble_tally}
+            return
+
+        cells = max(1, base.size)
+        chunk_size = max(1, min(chunk_size, MAX_CHUNK_CELLS // cells))
+        parallel = SIM_WORKERS > 1 and draws * cells >= PARALLEL_MIN_CELLS
+        wave_size = SIM_WORKERS if parallel else 1
+
+        done = 0
+        while done < draws:
+            chunks = []
+            planned = done
+            while len(chunks) < wave_size and planned < draws:
+                size = min(chunk_size, draws - planned)
+                chunks.append((size, seed_seq.spawn(1)[0]))
+                planned += size
+
+            wins, part, votes = self.run_wave(chunks, base, weights, benefit, dynamic,
+                                              fixed, detailed, method, weight_spec, noise,
+                                              ensemble_spec)
+            counts[index] += wins
+            if tally is not None:
+                self.merge_tally(tally, part)
+            if ensemble_tally is not None:
+                self.merge_tally(ensemble_tally, votes)
+            done = planned
+
+            margin = self.wilson_margin(int(counts.max()), done)
+            yield {"draws": done, "counts": counts, "margin": margin, "ranks": tally,
+                   "ensemble": ensemble_tally}
+
+            if precision is not None and margin <= precision:
+                break
+
+    def simulate_ensemble(self, problem, methods, draws=DEFAULT_DRAWS,
+                          chunk_size=DEFAULT_CHUNK, seed=None, rule=DEFAULT_CONSENSUS):
+        """
+        Ensemble tally (see `_tally_ensemble`) of `methods` over a fresh
+        simulation of `problem`, for results that were not simulated with
+        `simulate_chunks(..., ensemble=methods)` in the first place.
+
+        Chunks and seeds follow `simulate_chunks`, so each method's win
+        counts equal what `simulate` reports for it with the same seed.
+        """
+        for progress in self.simulate_chunks(problem, draws, chunk_size=chunk_size,
+                                             seed=seed, method=methods[0],
+                                             ensemble=methods, consensus=rule):
+            pass
+        return progress['ensemble']
+
+    def rank_summary(self, names, tally, draws):
+        """
+        Turn a rank tally into per-option extras and a pairwise table.
+
+        Returns (extras, pairwise): extras[i] holds option i's expected rank
+        (1-based) and, when detailed, its rank probabilities in percent;
+        pairwise is None or {"options": names, "beats": percent matrix}.
+        """
+        expected = tally['sum'] / draws + 1
+        extras = [{"expected_rank": round(float(e), 2)} for e in expected]
+        if tally['hist'] is None:
+            return extras, None
+
+        for extra, row in zip(extras, np.round(tally['hist'] * 100 / draws, 1).tolist()):
+            extra['rank_probabilities'] = row
+        pairwise = {
+            "options": list(names),
+            "beats":   np.round(tally['beats'] * 100 / draws, 1).tolist(),
+        }
+        return extras, pairwise
+
+    def simulate_stacked(self, problems, draws=DEFAULT_DRAWS, seeds=None,
+                         method=DEFAULT_METHOD):
+        """
+        Simulate several same-shape decisions in one array computation.
+
+        `problems` is a list of DecisionProblems with equal option and
+        criterion counts, the same dynamic mask and default noise (see
+        `noise_plan`). Each problem keeps its own seed stream, chunking and
+        clip bounds, so its (results, stats) match what `simulate` returns
+        for it alone.
+        """
+        seeds = seeds or [None] * len(problems)
+        seed_seqs = [self.seed_sequence(s) for s in seeds]
+        base = np.stack([p.values for p in problems])
+        weights = np.stack([p.weights for p in problems])[:, None, :]
+        benefit = np.stack([p.benefit for p in problems])[:, None, :]
+        dynamic = problems[0].dynamic
+        n_probs, n_opts, _ = base.shape
+        n_dyn = int(dynamic.sum())
+        plans = [self.noise_plan(p) for p in problems]
+        clip_lo = np.stack([plan['lo'] for plan in plans])[:, None, None, :]
+        clip_hi = np.stack([plan['hi'] for plan in plans])[:, None, None, :]
+
+        counts = np.zeros((n_probs, n_opts), dtype=np.int64)
+        offsets = (np.arange(n_probs) * n_opts)[:, None]
+        if not n_dyn:
+            scores = self.score_matrix(base, weights[:, 0], benefit[:, 0], method=method)
+            counts[np.arange(n_probs), scores.argmax(axis=-1)] = draws
+        else:
+            cells = max(1, base[0].size)
+            chunk_size = max(1, min(DEFAULT_CHUNK, MAX_CHUNK_CELLS // cells))
+            done = 0
+            while done < draws:
+                size = min(chunk_size, draws - done)
+                tensor = np.broadcast_to(
+                    base[:, None], (n_probs, size) + base.shape[1:]
+                ).copy()
+                noise = np.stack([
+                    self.spawn_rngs(ss, 1)[0].standard_normal((size, n_opts, n_dyn))
+                    for ss in seed_seqs
+                ])
+                tensor[..., dynamic] = np.clip(tensor[..., dynamic] + noise, clip_lo, clip_hi)
+
+                # Sub-stacks keep each scoring call within the cell budget
+                step = max(1, MAX_CHUNK_CELLS // max(1, tensor[0].size))
+                for lo in range(0, n_probs, step):
+                    hi = min(lo + step, n_probs)
+                    scores = self.score_matrix(
+                        tensor[lo:hi], weights[lo:hi], benefit[lo:hi], method=method
+                    )
+                    winners = (scores.argmax(axis=-1) + offsets[:hi - lo]).ravel()
+                    counts[lo:hi] += np.bincount(
+                        winners, minlength=(hi - lo) * n_opts
+                    ).reshape(hi - lo, n_opts)
+                done += size
+
+        runs = []
+        for problem, row, ss in zip(problems, counts, seed_seqs):
+            margin = self.wilson_margin(int(row.max()), draws) if n_dyn else 0.0
+            stats = {
+                "draws":  draws,
+                "margin": round(margin * 100, 2),
+                "seed":   ss.entropy,
+            }
+            runs.append((self.confidence_table(problem.names, row, draws), stats))
+        return runs
+
+    def confidence_table(self, names, counts, draws, front=None, scores=None,
+                         extras=None):
+        """
+        Options sorted by the percentage of draws they won.
+
+        With a skyline `front` mask, dominated options follow the simulated
+        ones, flagged and ordered by their deterministic TOPSIS `scores`.
+        `extras` are per-option dicts merged into the rows; when they carry
+        expected ranks, those break ties in confidence.
+        """
+        rows = [
+            {"name": name, "confidence": round(c * 100 / draws, 1)}
+            for name, c in zip(names, counts.tolist())
+        ]
+        key = lambda x: x['confidence']
+        if extras is not None:
+            for row, extra in zip(rows, extras):
+                row.update(extra)
+            key = lambda x: (-x['confidence'], x['expected_rank'])
+        reverse = extras is None
+
+        if front is None:
+            return sorted(rows, key=key, reverse=reverse)
+
+        for row, on_front in zip(rows, front.tolist()):
+            row['dominated'] = not on_front
+        simulated = sorted(
+            (r for r, f in zip(rows, front) if f), key=key, reverse=reverse
+        )
+        dominated = [rows[i] for i in np.argsort(-scores, kind='stable') if not front[i]]
+        return simulated + dominated
+
+    def simulate_progress(self, problem, draws=DEFAULT_DRAWS,
+                          precision=None, chunk_size=DEFAULT_CHUNK, seed=None,
+                          prefilter=False, rank_stats=False, method=DEFAULT_METHOD,
+                          weight_model=None, concentration=WEIGHT_CONCENTRATION,
+                          ensemble=None, consensus=DEFAULT_CONSENSUS):
+        """
+        Generator form of `simulate`.
+
+        Yields the `simulate_chunks` progress after every chunk, then one
+        final {"done": True, "results": ..., "stats": ..., "ensemble": ...}
+        item, "ensemble" being the ensemble tally or None. Closing the
+        generator early stops the simulation before its next chunk.
+        """
+        seed_seq = self.seed_sequence(seed)
+        # Sampled weights are reported as rank acceptability indices
+        rank_stats = rank_stats or weight_model is not None
+        front = scores = None
+        if prefilter and not rank_stats:
+            front = self.skyline(problem.values, problem.benefit, problem.dynamic,
+                                 noise=self.noise_plan(problem))
+            scores = self.score_matrix(problem.values, problem.weights,
+                                       problem.benefit, method=method)
+
+        progress = None
+        for progress in self.simulate_chunks(problem, draws, precision, chunk_size,
+                                             seed_seq, front, rank_stats, method,
+                                             weight_model, concentration,
+                                             ensemble, consensus):
+            yield progress
+
+        extras = pairwise = None
+        if rank_stats:
+            extras, pairwise = self.rank_summary(problem.names, progress['ranks'],
+                                                 progress['draws'])
+
+        results = self.confidence_table(problem.names, progress['counts'],
+                                        progress['draws'], front, scores, extras)
+        stats = {
+            "draws":  progress['draws'],
+            "margin": round(progress['margin'] * 100, 2),
+            "seed":   seed_seq.entropy,
+        }
+        if front is not None:
+            stats['dominated'] = int((~front).sum())
+        if pairwise is not None:
+            stats['pairwise'] = pairwise
+        if weight_model is not None:
+            stats['weights'] = {"model": weight_model}
+            if weight_model == "dirichlet":
+                stats['weights']['concentration'] = concentration
+        yield {"done": True, "results": results, "stats": stats,
+               "ensemble": progress['ensemble']}
+
+    def simulate(self, problem, draws=DEFAULT_DRAWS,
+                 precision=None, chunk_size=DEFAULT_CHUNK, seed=None,
+                 prefilter=False, rank_stats=False, method=DEFAULT_METHOD,
+                 weight_model=None, concentration=WEIGHT_CONCENTRATION):
+        """
+        Monte Carlo over the dynamic criteria, scored with `method`.
+
+        Returns (results, stats): results are options sorted by the
+        percentage of draws they won, stats holds the number of draws run,
+        the margin on the leader's confidence and the seed used.
+
+        With `prefilter`, options off the skyline are left out of the
+        simulation and reported with 0% confidence after the rest.
+
+        With `rank_stats`, rows also carry expected ranks (and rank
+        probabilities for small problems) and stats gains a pairwise
+        "A beats B" matrix, all from the same draws. Ranks need every option
+        scored in every draw, so `prefilter` is ignored in that case.
+
+        With a `weight_model` the weights are sampled too (SMAA-style, see
+        `sample_weights`); rank statistics are then always on, and the
+        rank probabilities are the options' rank acceptability indices.
+        """
+        for final in self.simulate_progress(problem, draws, precision, chunk_size,
+                                            seed, prefilter, rank_stats, method,
+                                            weight_model, concentration):
+            pass
+        return final['results'], final['stats']
+
+    def _weights_along(self, weights, crit, share):
+        """
+        Weight vectors with criterion crit[m] moved to share[m] and the other
+        weights rescaled proportionally so every vector still sums to 1.
+        """
+        rest = 1 - weights[crit]
+        scale = np.divide(1 - share, rest, out=np.zeros_like(share), where=rest > 0)
+        moved = weights[None, :] * scale[:, None]
+        moved[np.arange(len(crit)), crit] = share
+        return moved
+
+    def _winners(self, values, benefit, weight_rows, method=DEFAULT_METHOD, distances=None):
+        """
+        Winner (row index) of `values` under each weight vector. With TOPSIS
+        `distances` (see `topsis_distances`), each weight vector costs one
+        matrix product instead of a full re-scoring.
+        """
+        winners = np.empty(len(weight_rows), dtype=np.int64)
+        if distances is not None:
+            step = max(1, MAX_CHUNK_CELLS // max(1, len(values)))
+            for lo in range(0, len(weight_rows), step):
+                closeness = self.topsis_closeness(*distances, weight_rows[lo:lo + step])
+                winners[lo:lo + step] = closeness.argmax(axis=0)
+            return winners
+
+        step = max(1, MAX_CHUNK_CELLS // max(1, values.size))
+        for lo in range(0, len(weight_rows), step):
+            scores = self.score_matrix(values, weight_rows[lo:lo + step], benefit,
+                                       method=method)
+            winners[lo:lo + step] = scores.argmax(axis=-1)
+        return winners
+
+    def weight_stability(self, problem, grid=STABILITY_GRID, steps=STABILITY_STEPS,
+                         method=DEFAULT_METHOD):
+        """
+        How far each criterion's weight can move before the winner under
+        `method` changes, with the other weights rescaled to keep the total
+        at 1.
+
+        All criteria are swept at once over `grid` evenly spaced weights in
+        one batched scoring call; each bound is then bracketed by the sweep and
+        refined by `steps` rounds of bisection, again batched over every
+        bound. Only the interval containing the current weight counts. For
+        TOPSIS the unweighted distances are computed once, so every weight
+        vector tried is just a matrix product.
+
+        Returns (winner, intervals): the winner's row and, per criterion,
+        (lower, upper, lower_rival, upper_rival) with bounds as weight
+        fractions and rivals the rows that win just past each bound (None
+        when the winner holds all the way to 0 or 1).
+        """
+        values, benefit = problem.values, problem.benefit
+        weights = problem.weights
+        n_crit = len(weights)
+        distances = self.topsis_distances(values, benefit) if method == "topsis" else None
+        winners = lambda rows: self._winners(values, benefit, rows, method, distances)
+        winner = int(winners(weights[None])[0])
+        if n_crit < 2:
+            return winner, [(1.0, 1.0, None, None)] * n_crit
+
+        # Sweep: (criteria, grid) winners from one batched call
+        shares = np.linspace(0.0, 1.0, grid)
+        crit = np.repeat(np.arange(n_crit), grid)
+        sweep = winners(
+            self._weights_along(weights, crit, np.tile(shares, n_crit))
+        ).reshape(n_crit, grid)
+        holds = sweep == winner
+
+        # Bracket each bound between an inside point (winner holds) and
+        # the first grid point past it where it doesn't
+        inside, outside, owner, side = [], [], [], []
+        for j in range(n_crit):
+            w = weights[j]
+            above = np.flatnonzero((shares > w) & ~holds[j])
+            below = np.flatnonzero((shares < w) & ~holds[j])
+            if len(above):
+                k = above[0]
+                inside.append(max(w, shares[k - 1]))
+                outside.append(shares[k])
+                owner.append(j)
+                side.append(1)
+            if len(below):
+                k = below[-1]
+                inside.append(min(w, shares[k + 1]))
+                outside.append(shares[k])
+                owner.append(j)
+                side.append(0)
+
+        bounds = [[0.0, 1.0, None, None] for _ in range(n_crit)]
+        if owner:
+            inside = np.array(inside)
+            outside = np.array(outside)
+            owner = np.array(owner)
+            for _ in range(steps):
+                mid = (inside + outside) / 2
+                ok = winners(self._weights_along(weights, owner, mid)) == winner
+                inside = np.where(ok, mid, inside)
+                outside = np.where(ok, outside, mid)
+            rivals = winners(self._weights_along(weights, owner, outside))
+            for j, s, edge, rival in zip(owner.tolist(), side,
+                                         ((inside + outside) / 2).tolist(), rivals.tolist()):
+                bounds[j][s] = edge
+                bounds[j][2 + s] = rival
+
+        return winner, [tuple(b) for b in bounds]
+
+    def rank_reversals(self, problem, top_k=REVERSAL_TOP, limit=REVERSAL_LIMIT):
+        """
+        Check whether removing each non-winning option changes the TOPSIS
+        order of the top `top_k` remaining options.
+
+        Removals are scored in batches without rebuilding the problem: each
+        column's norm drops the removed row's squared contribution, and its
+        extremes fall back to the runner-up row when the removed row held
+        them. At most `limit` removals are checked, best-ranked first.
+
+        Returns (order, checked, reversals): the full ranking as row indices,
+        the number of removals checked and a list of (removed row, new top
+        rows) for every removal that changed the top-k order.
+        """
+        values, weights, benefit = problem.values, problem.weights, problem.benefit
+        n_opts, n_crit = values.shape
+        scores, _, _, _ = self.topsis_matrix(values, weights, benefit)
+        order = np.argsort(-scores, kind='stable')
+        top_k = min(top_k, n_opts - 1)
+        removed_all = order[1:limit + 1]
+        if top_k < 1:
+            return order, 0, []
+
+        sq = np.einsum('ij,ij->j', values, values)
+        cols = np.arange(n_crit)
+        # Two largest and two smallest rows per column; positive scaling
+        # keeps raw and normalized extremes on the same rows
+        high = np.argsort(-values, axis=0, kind='stable')[:2]
+        low = np.argsort(values, axis=0, kind='stable')[:2]
+
+        reversals = []
+        step = max(1, MAX_CHUNK_CELLS // max(1, values.size))
+        for lo in range(0, len(removed_all), step):
+            removed = removed_all[lo:lo + step]
+            m = len(removed)
+            drop = values[removed]
+            den = np.sqrt(np.clip(sq - drop * drop, 0, None))
+            den = np.where(den > 0, den, 1.0)
+            scale = weights / den
+            norm = values[None] * scale[:, None, :]
+
+            hi_row = np.where(high[0] == removed[:, None], high[1], high[0])
+            lo_row = np.where(low[0] == removed[:, None], low[1], low[0])
+            col_max = values[hi_row, cols] * scale
+            col_min = values[lo_row, cols] * scale
+            ideal = np.where(benefit, col_max, col_min)
+            anti_ideal = np.where(benefit, col_min, col_max)
+
+            d1 = np.sqrt(((norm - ideal[:, None, :]) ** 2).sum(axis=-1))
+            d2 = np.sqrt(((norm - anti_ideal[:, None, :]) ** 2).sum(axis=-1))
+            total = d1 + d2
+            part = np.divide(d2, total, out=np.full_like(total, 0.5), where=total > 0)
+            part[np.arange(m), removed] = -np.inf
+
+            top = np.argsort(-part, axis=1, kind='stable')[:, :top_k]
+            # The order the rest would keep if removal had no side effects
+            kept = np.broadcast_to(order, (m, n_opts))
+            expected = kept[kept != removed[:, None]].reshape(m, n_opts - 1)[:, :top_k]
+            changed = (top != expected).any(axis=1)
+            reversals.extend(zip(removed[changed].tolist(), top[changed].tolist()))
+
+        return order, len(removed_all), reversals
+
+    def gap_matrix(self, problem):
+        """
+        Options x criteria gap from each column's raw ideal, as a percentage
+        of the column's raw range (0 where the column is constant), rounded
+        to one decimal. Also returns each row's criteria ordered by gap,
+        ties kept in criterion order.
+        """
+        values = problem.values
+        if len(values):
+            col_max = values.max(axis=0)
+            col_min = values.min(axis=0)
+        else:
+            col_max = col_min = np.zeros(values.shape[1])
+        ideal_raw = np.where(problem.benefit, col_max, col_min)
+        worst_raw = np.where(problem.benefit, col_min, col_max)
+
+        raw_range = np.abs(ideal_raw - worst_raw)
+        safe_range = np.where(raw_range > 0, raw_range, 1.0)
+        gaps = np.where(raw_range > 0, np.abs(values - ideal_raw) / safe_range * 100, 0.0)
+        gaps = np.round(gaps, 1)
+
+        order = np.argsort(gaps, axis=1, kind='stable')
+        return gaps, order
+
+    def explain_option(self, problem, gaps, order, row):
+        """
+        Explanation list for option `row`, sorted from the smallest gap,
+        from the gap matrix and orderings of `gap_matrix`. Built per option
+        so a report never holds every option's list at once.
+        """
+        criteria = problem.criteria
+        actuals = problem.values[row].tolist()
+        row_gaps = gaps[row].tolist()
+        return [
+            {
+                "id":      problem.ids[j],
+                "name":    criteria[j]['name'],
+                "actual":  actuals[j],
+                "gap_pct": row_gaps[j],
+                "weight":  criteria[j]['weight'],
+            }
+            for j in order[row].tolist()
+        ]
+
+    def strict_leaders(self, gaps):
+        """
+        Options x criteria mask of cells whose gap is strictly smaller than
+        every other option's gap on that criterion.
+
+        Only the column minimum can qualify, and only if the second-smallest
+        value in the column is larger, so one partition per column suffices.
+        """
+        if len(gaps) < 2:
+            return np.ones(gaps.shape, dtype=bool)
+        lowest = np.partition(gaps, 1, axis=0)
+        return (gaps == lowest[0]) & (lowest[0] < lowest[1])
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of serialized /analyze responses with a TTL.
+
+    Keys are content hashes of the request, values the JSON body bytes,
+    so a hit is returned without any recomputation or re-serialization.
+    With `max_bytes`, least recently used entries are also evicted while
+    the values' total size (len() of bytes, else their `nbytes`) is over it.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL, max_bytes=CACHE_BYTES):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()  # {key: (expires_at, body, size)}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(body):
+        return len(body) if isinstance(body, bytes) else body.nbytes
+
+    def _drop(self, key):
+        self.bytes -= self._entries.pop(key)[2]
+
+    @staticmethod
+    def make_key(data):
+        """Canonical hash of everything that determines the response."""
+        payload = {
+            "goal":           data.get('goal'),
+            "criteria":       data.get('criteria'),
+            "options":        data.get('options'),
+            "seed":           data.get('seed'),
+            "precision":      data.get('precision'),
+            "max_iterations": data.get('max_iterations'),
+            "prefilter":      data.get('prefilter'),
+            "rank_stats":     data.get('rank_stats'),
+            "method":         data.get('method'),
+            "ensemble":       data.get('ensemble'),
+            "consensus":      data.get('consensus'),
+            "weights":        [data.get('weight_uncertainty'),
+                               data.get('weight_concentration')],
+            "sensitivity":    data.get('sensitivity'),
+            "rank_reversal":  data.get('rank_reversal'),
+        }
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, body):
+        if self.max_size <= 0:
+            return
+        size = self._size(body)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, body, size)
+            self.bytes += size
+            while len(self._entries) > self.max_size or (
+                    self.max_bytes is not None and self.bytes > self.max_bytes
+                    and len(self._entries) > 1):
+                self._drop(next(iter(self._entries)))
+
+    def discard(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._drop(key)
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size":      len(self._entries),
+                "max_size":  self.max_size,
+                "bytes":     self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl":       self.ttl,
+                "hits":      self.hits,
+                "misses":    self.misses,
+            }
+
+
+result_cache = ResultCache()
+
+
+class WhatIfSession:
+    """
+    Prepared simulation of one decision for incremental what-if edits.
+
+    Holds the perturbed draw tensor, the noise that produced it and, per
+    draw, option and criterion, the unweighted squared distance to the
+    column's ideal and anti-ideal. Editing one cell renormalizes only its
+    column; a priority change only re-weights the stored distances. Every
+    revision scores the same draws (common random numbers), so differences
+    between revisions come from the edits rather than from sampling noise.
+
+    The draws are generated chunk by chunk exactly as `simulate` does, so
+    the first revision matches /analyze for the same seed. The draw count
+    is capped at WHATIF_MAX_CELLS / (options x criteria) and so that the
+    session's arrays fit in WHATIF_MAX_BYTES, the budget all sessions
+    share; `precision`, `prefilter` and `weight_uncertainty` don't apply.
+    The stored distances are TOPSIS-specific; with any other method each
+    revision rescores the stored draws instead.
+    """
+
+    def __init__(self, engine, decision):
+        self.engine = engine
+        self.decision = dict(decision)
+        self.revision = 0
+        self.lock = threading.Lock()
 
-        return all_explanations, results
+        problem = decision['problem']
+        n_opts, n_crit = problem.values.shape
+        cells = max(1, problem.values.size)
+        self.seed_seq = engine.seed_sequence(decision['seed'])
+        self.values = problem.values.copy()
+        self.raw_values = [list(row) for row in decision['raw_values']]
+
+        dynamic = problem.dynamic
+        self.noise_col = np.cumsum(dynamic) - 1   # criterion -> column of `noise`
+        n_dyn = int(dynamic.sum())
+        plan = engine.noise_plan(problem)
+        self.incremental = decision['method'] == "topsis"
+
+        # float64 bytes per draw: the tensor, the raw normal (and uniform)
+        # draws and, for TOPSIS, both distance tensors
+        per_draw = 8 * (cells * (3 if self.incremental else 1)
+                        + n_opts * n_dyn * (2 if plan['uniform'] else 1))
+        self.draws = max(1, min(decision['draws'], WHATIF_MAX_CELLS // cells,
+                                WHATIF_MAX_BYTES // per_draw))
+        self.uniform = None
+        if n_dyn:
+            chunk_size = max(1, min(DEFAULT_CHUNK, MAX_CHUNK_CELLS // cells))
+            normal, uniform = [], []
+            done = 0
+            while done < self.draws:
+                size = min(chunk_size, self.draws - done)
+                rng = np.random.default_rng(self.seed_seq.spawn(1)[0])
+                z, u = engine.noise_draws(plan, size, n_opts, n_dyn, rng)
+                normal.append(z)
+                uniform.append(u)
+                done += size
+            self.noise = np.concatenate(normal)
+            if plan['uniform']:
+                self.uniform = np.concatenate(uniform)
+            self.repeat = 1
+        else:
+            # Every draw is the same, so score one and count it `draws` times
+            self.noise = np.empty((1, n_opts, 0))
+            self.repeat = self.draws
+
+        self.tensor = np.broadcast_to(
+            self.values, (len(self.noise), n_opts, n_crit)
+        ).copy()
+        self.tensor[..., dynamic] = engine.apply_noise(plan, self.tensor[..., dynamic],
+                                                       self.noise, self.uniform)
+        if self.incremental:
+            self.dist_ideal, self.dist_anti = engine.topsis_distances(self.tensor,
+                                                                      problem.benefit)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the session's arrays, for the shared session budget."""
+        arrays = [self.values, self.noise, self.uniform, self.tensor]
+        if self.incremental:
+            arrays += [self.dist_ideal, self.dist_anti]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def _option(self, ref):
+        names = self.decision['problem'].names
+        if isinstance(ref, int) and 0 <= ref < len(names):
+            return ref
+        if ref in names:
+            return names.index(ref)
+        raise KeyError(f"unknown option {ref!r}")
+
+    def _criterion(self, ref):
+        for j, c in enumerate(self.decision['problem'].criteria):
+            if ref in (c['id'], c['name']):
+                return j
+        raise KeyError(f"unknown criterion {ref!r}")
+
+    def apply(self, changes=(), priorities=None):
+        """
+        Apply one revision of edits.
+
+        changes:    [{"option": name or index, "criterion": id or name,
+                      "value": new value}, ...]
+        priorities: optional {criterion id or name: priority}
+
+        All references are resolved before anything is modified, so a bad
+        edit leaves the session unchanged.
+        """
+        problem = self.decision['problem']
+        cells = [
+            (self._option(c['option']), self._criterion(c['criterion']), c['value'])
+            for c in changes
+        ]
+        new_priorities = [c['priority'] for c in problem.criteria]
+        for ref, priority in (priorities or {}).items():
+            new_priorities[self._criterion(ref)] = int(priority)
+
+        touched = set()
+        for i, j, value in cells:
+            self.values[i, j] = self.engine._to_float(value)
+            self.raw_values[i][j] = str(value).strip()
+            touched.add(j)
+
+        criteria = [dict(c) for c in problem.criteria]
+        if priorities:
+            weights = self.engine.calculate_roc_weights_with_ties(new_priorities)
+            counts = Counter(new_priorities)
+            for c, p, w in zip(criteria, new_priorities, weights):
+                c.update(priority=p, tied=counts[p] > 1, weight=w)
+        problem = DecisionProblem(problem.names, criteria, self.values)
+
+        if touched:
+            # An edit can move a column's observed clip range, so edited
+            # columns are redrawn whole from the stored raw draws
+            cols = sorted(touched)
+            plan = self.engine.noise_plan(problem)
+            for j in cols:
+                if not problem.dynamic[j]:
+                    self.tensor[..., j] = self.values[:, j]
+                    continue
+                pos = [self.noise_col[j]]
+                u = None if self.uniform is None else self.uniform[..., pos]
+                self.tensor[..., j] = self.engine.apply_noise(
+                    plan, self.values[None, :, [j]], self.noise[..., pos], u, cols=pos
+                )[..., 0]
+            if self.incremental:
+                near, far = self.engine.topsis_distances(self.tensor[..., cols],
+                                                         problem.benefit[cols])
+                self.dist_ideal[..., cols] = near
+                self.dist_anti[..., cols] = far
+
+        self.decision['problem'] = problem
+        self.decision['raw_values'] = self.raw_values
+        self.revision += 1
+
+    def simulate(self):
+        """(results, stats) for the current revision over the stored draws."""
+        engine = self.engine
+        problem = self.decision['problem']
+        if self.incremental:
+            w2 = problem.weights ** 2
+            d1 = np.sqrt(self.dist_ideal @ w2)
+            d2 = np.sqrt(self.dist_anti @ w2)
+            total = d1 + d2
+            scores = np.divide(d2, total, out=np.full_like(total, 0.5), where=total > 0)
+        else:
+            scores = np.empty(self.tensor.shape[:2])
+            step = max(1, MAX_CHUNK_CELLS // max(1, self.values.size))
+            for lo in range(0, len(scores), step):
+                scores[lo:lo + step] = engine.score_matrix(
+                    self.tensor[lo:lo + step], problem.weights, problem.benefit,
+                    method=self.decision['method'])
+
+        n_opts = len(problem)
+        counts = np.bincount(scores.argmax(axis=-1), minlength=n_opts) * self.repeat
+        extras = pairwise = None
+        if self.decision['rank_stats']:
+            tally = engine.new_tally(n_opts, n_opts <= RANK_DETAIL_LIMIT)
+            engine._tally_ranks(tally, scores, repeat=self.repeat)
+            extras, pairwise = engine.rank_summary(problem.names, tally, self.draws)
+
+        margin = engine.wilson_margin(int(counts.max()), self.draws) if self.repeat == 1 else 0.0
+        stats = {
+            "draws":  self.draws,
+            "margin": round(margin * 100, 2),
+            "seed":   self.seed_seq.entropy,
+        }
+        if pairwise is not None:
+            stats['pairwise'] = pairwise
+        return engine.confidence_table(problem.names, counts, self.draws, extras=extras), stats
+
+    def analysis(self, session_id):
+        """The /analyze response for the current revision, plus session info."""
+        t0 = time.perf_counter()
+        sim, stats = self.simulate()
+        simulated = (sim, stats, (time.perf_counter() - t0) * 1000)
+        result = analyze_decision(self.engine, self.decision, simulated)
+        result['session'] = {"id": session_id, "revision": self.revision}
+        return result
+
+
+# Sessions are plain objects in a ResultCache, so they share its LRU/TTL
+# eviction; the byte budget bounds their arrays across all sessions
+whatif_sessions = ResultCache(WHATIF_SESSIONS, WHATIF_TTL, WHATIF_MAX_BYTES)
+
+
+def bad_request(exc):
+    """400 response for a payload rejected with `exc`, with a JSON error body."""
+    return jsonify({"error": f"{type(exc).__name__}: {exc}"}), 400
 
 
 @app.route("/")
@@ -182,46 +1795,51 @@ def analyze():
 
     data = request.json
     engine = DecisionEngine()
+    if data.get('stream'):
+        # Streamed responses are not cached. Parse before streaming so a bad
+        # payload fails the request instead of truncating a 200 body
+        try:
+            decision = parse_decision(engine, data)
+        except (KeyError, ValueError, TypeError) as exc:
+            return bad_request(exc)
+        return app.response_class(stream_analysis(engine, decision),
+                                  mimetype="application/x-ndjson")
 
-    goal = data['goal']
-    criteria_data = data['criteria']
-    options_data = data['options']
+    key = result_cache.make_key(data)
 
-    # Extract priorities — default to position order if not provided
-    priorities = [int(c.get('priority', i + 1)) for i, c in enumerate(criteria_data)]
-    priority_counts = Counter(priorities)
+    body = result_cache.get(key)
+    if body is None:
+        try:
+            decision = parse_decision(engine, data)
+        except (KeyError, ValueError, TypeError) as exc:
+            return bad_request(exc)
+        body = app.json.dumps(analyze_decision(engine, decision)).encode("utf-8")
+        result_cache.put(key, body)
+        status = "MISS"
+    else:
+        status = "HIT"
 
-    # Assign weights using tied-aware ROC
-    weights = engine.calculate_roc_weights_with_ties(priorities)
+    response = app.response_class(body, mimetype="application/json")
+    response.headers["X-Cache"] = status
+    return response
 
-    criteria = []
-    for i, c in enumerate(criteria_data):
-        criteria.append({
-            "id":       f"c{i}",
-            "name":     c['name'],
-            "type":     c['type'],
-            "dynamic":  c['dynamic'],
-            "priority": priorities[i],
-            "tied":     priority_counts[priorities[i]] > 1,
-            "weight":   weights[i]
-        })
 
-    options = []
-    raw_values_map = {}  # {option_name: {c_id: original_string}}
-    for o in options_data:
-        vals = {}
-        raw_vals = {}
-        for i, v in enumerate(o['values']):
-            cid = f"c{i}"
-            vals[cid] = engine._to_float(v)
-            raw_vals[cid] = str(v).strip()  # keep exactly what the user typed
-        options.append({"name": o['name'], "values": vals})
-        raw_values_map[o['name']] = raw_vals
+@app.route("/analyze/cache", methods=["GET"])
+def analyze_cache_stats():
+    return jsonify(result_cache.stats())
 
-    original_options = copy.deepcopy(options)
 
-    sim = engine.simulate(options, criteria)
-    all_explanations, _ = engine.explain_all(original_options, criteria)
+def build_report(engine, sim, problem, gaps, order, raw_values, lazy=False):
+    """
+    Response stage: winner reasoning plus the per-option breakdown, from
+    the gap matrix and orderings of `DecisionEngine.gap_matrix`.
+
+    Returns (reasoning, breakdown); with `lazy` the breakdown is a generator
+    that builds one record, and its explanation list, at a time.
+    """
+    # Index the gap matrix once instead of searching explanation lists
+    leaders = engine.strict_leaders(gaps)
+    col_of = {cid: j for j, cid in enumerate(problem.ids)}
 
     def gap_to_relative_label(gap_pct):
         """
@@ -234,7 +1852,7 @@ def analyze():
         elif gap_pct <= 60:   return "average"
         else:                 return "below average"
 
-    def find_differentiating_crit(winner_name, winner_expl, all_explanations, original_options):
+    def find_differentiating_crit(winner_row, winner_expl):
         """
         Find the criterion that best explains WHY the winner won.
 
@@ -245,20 +1863,9 @@ def analyze():
         2. If no such criterion exists (e.g. all criteria are tied across options),
            fall back to the lowest-gap / highest-weight criterion of the winner.
         """
-        other_names = [o['name'] for o in original_options if o['name'] != winner_name]
-
-        # For each criterion of the winner, check if it's strictly better than every other option
-        differentiating = []
-        for e in winner_expl:
-            cid = e['id']
-            winner_gap = e['gap_pct']
-            others_gaps = [
-                next(x['gap_pct'] for x in all_explanations[n] if x['id'] == cid)
-                for n in other_names
-            ]
-            # Winner must be strictly better (lower gap) than ALL others
-            if all(winner_gap < og for og in others_gaps):
-                differentiating.append(e)
+        # Criteria where the winner is strictly better (lower gap) than ALL others
+        winner_leads = leaders[winner_row]
+        differentiating = [e for e in winner_expl if winner_leads[col_of[e['id']]]]
 
         if differentiating:
             # Pick the most important (highest weight) differentiating criterion
@@ -269,37 +1876,290 @@ def analyze():
 
     # Winner reasoning
     winner = sim[0]['name']
-    winner_expl = all_explanations[winner]
-    best_crit = find_differentiating_crit(winner, winner_expl, all_explanations, original_options)
-    winner_raw_val = raw_values_map[winner][best_crit['id']]
+    winner_row = problem.names.index(winner)
+    winner_expl = engine.explain_option(problem, gaps, order, winner_row)
+    best_crit = find_differentiating_crit(winner_row, winner_expl)
+    winner_raw_val = raw_values[winner_row][col_of[best_crit['id']]]
     reasoning = f"'{winner}' is selected due to its {best_crit['name']} of {winner_raw_val}."
 
-    # Per-option breakdown
-    breakdown = []
-    for o in original_options:
-        name = o['name']
-        expl = all_explanations[name]
-        confidence = next(r['confidence'] for r in sim if r['name'] == name)
-        rank = next(i + 1 for i, r in enumerate(sim) if r['name'] == name)
-
-        opt_best = find_differentiating_crit(name, expl, all_explanations, original_options)
-        opt_raw_val = raw_values_map[name][opt_best['id']]
-        selection_note = f"'{name}' is notable for its {opt_best['name']} of {opt_raw_val}."
-
-        strengths  = [e['name'] for e in expl if e['gap_pct'] <= 40]
-        weaknesses = [e['name'] for e in expl if e['gap_pct'] > 40]
-
-        breakdown.append({
-            "name":           name,
-            "rank":           rank,
-            "confidence":     confidence,
-            "selection_note": selection_note,
-            "strengths":      strengths,
-            "weaknesses":     weaknesses,
+    # Rank, confidence and expected rank per option row, from one linear
+    # pass over a name -> (rank, result) index. Arrays rather than the
+    # result dicts, so a lazy breakdown doesn't keep `sim` alive
+    n = len(problem)
+    ranks = np.zeros(n, dtype=np.int64)
+    confidences = np.zeros(n)
+    expected = np.full(n, np.nan)
+    sim_index = {}
+    for i, r in enumerate(sim):
+        sim_index.setdefault(r['name'], (i + 1, r))
+    for row, name in enumerate(problem.names):
+        rank, sim_row = sim_index[name]
+        ranks[row] = rank
+        confidences[row] = sim_row['confidence']
+        expected[row] = sim_row.get('expected_rank', np.nan)
+    del sim_index
+
+    def iter_breakdown():
+        for row, name in enumerate(problem.names):
+            expl = engine.explain_option(problem, gaps, order, row)
+            rank = int(ranks[row])
+            confidence = float(confidences[row])
+
+            opt_best = find_differentiating_crit(row, expl)
+            opt_raw_val = raw_values[row][col_of[opt_best['id']]]
+            selection_note = f"'{name}' is notable for its {opt_best['name']} of {opt_raw_val}."
+
+            strengths  = [e['name'] for e in expl if e['gap_pct'] <= 40]
+            weaknesses = [e['name'] for e in expl if e['gap_pct'] > 40]
+
+            entry = {
+                "name":           name,
+                "rank":           rank,
+                "confidence":     confidence,
+                "selection_note": selection_note,
+                "strengths":      strengths,
+                "weaknesses":     weaknesses,
+            }
+            if not np.isnan(expected[row]):
+                entry['expected_rank'] = float(expected[row])
+            yield entry
+
+    breakdown = iter_breakdown()
+    return reasoning, breakdown if lazy else list(breakdown)
+
+
+def parse_noise(spec):
+    """
+    Validate a criterion's optional "noise" spec for the simulation.
+
+    Draws are offsets added to the option's value, except lognormal,
+    which multiplies it:
+
+      {"type": "normal", "sigma": 1}
+      {"type": "uniform", "low": -1, "high": 1}
+      {"type": "triangular", "low": -1, "mode": 0, "high": 1}
+      {"type": "lognormal", "sigma": 0.1}
+      {"type": "empirical", "values": [-2, 0, 1], "weights": [1, 2, 1]}
+
+    "clip" is [low, high], null for no clipping, or omitted to clip to
+    the range of values observed across options. Only dynamic criteria
+    are perturbed, so only they may carry a spec (see `parse_decision`).
+    """
+    if spec is None:
+        return None
+    if not isinstance(spec, dict):
+        raise ValueError("noise must be an object such as {\"type\": \"normal\", \"sigma\": 1}")
+    kind = str(spec.get('type', "normal")).lower()
+    if kind not in NOISE_MODELS:
+        raise ValueError(f"unknown noise type {kind!r}; expected one of {', '.join(NOISE_MODELS)}")
+
+    noise = {"type": kind}
+    if kind in ("normal", "lognormal"):
+        noise['sigma'] = float(spec.get('sigma', 1.0 if kind == "normal" else 0.1))
+        if noise['sigma'] < 0:
+            raise ValueError("noise sigma must be non-negative")
+    elif kind in ("uniform", "triangular"):
+        noise['low'] = float(spec.get('low', -1.0))
+        noise['high'] = float(spec.get('high', 1.0))
+        if kind == "triangular":
+            noise['mode'] = float(spec.get('mode', 0.0))
+        if not noise['low'] <= noise.get('mode', noise['low']) <= noise['high']:
+            raise ValueError(f"{kind} noise needs low <= mode <= high")
+    else:
+        values = [float(v) for v in spec['values']]
+        weights = [float(w) for w in spec.get('weights', [1.0] * len(values))]
+        if not values or len(weights) != len(values) or min(weights) < 0 or sum(weights) <= 0:
+            raise ValueError("empirical noise needs values and matching non-negative weights")
+        noise['values'] = values
+        noise['weights'] = weights
+
+    clip = spec.get('clip', "observed")
+    if clip not in (None, "observed"):
+        if not isinstance(clip, (list, tuple)) or len(clip) != 2:
+            raise ValueError("noise clip must be [low, high] or null")
+        clip = [float(clip[0]), float(clip[1])]
+        if clip[0] > clip[1]:
+            raise ValueError("noise clip needs low <= high")
+    noise['clip'] = clip
+    return noise
+
+
+def parse_decision(engine, data):
+    """
+    Validate one decision payload into a DecisionProblem.
+
+    Returns a dict with the goal, the problem, the raw values as typed
+    (options x criteria lists of strings) and the simulation settings.
+    """
+    goal = data['goal']
+    criteria_data = data['criteria']
+    options_data = data['options']
+
+    # Simulation budget — optional target precision in percentage points
+    precision = data.get('precision')
+    if precision is not None:
+        precision = max(float(precision), 0.01) / 100
+        default_draws = MAX_DRAWS
+    else:
+        default_draws = DEFAULT_DRAWS
+    max_draws = int(data.get('max_iterations', default_draws))
+    max_draws = max(1, min(max_draws, MAX_DRAWS))
+
+    # Optional seed for reproducible simulations
+    seed = data.get('seed')
+    seed = int(seed) if seed is not None else None
+    if seed is not None and seed < 0:
+        raise ValueError("seed must be a non-negative integer")
+
+    # Optional skyline pre-stage that drops dominated options from the simulation
+    prefilter = bool(data.get('prefilter', False))
+
+    # Optional rank distribution / pairwise output from the same draws
+    rank_stats = bool(data.get('rank_stats', False))
+
+    # Optional weight-stability intervals for the TOPSIS winner
+    sensitivity = bool(data.get('sensitivity', False))
+
+    # Optional rank-reversal audit: true for the default top-k, or a number
+    rank_reversal = data.get('rank_reversal') or 0
+    if rank_reversal is True:
+        rank_reversal = REVERSAL_TOP
+    rank_reversal = max(0, int(rank_reversal))
+
+    # Scoring method used by the simulation and sensitivity stages
+    method = str(data.get('method') or DEFAULT_METHOD).lower()
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}; expected one of {', '.join(METHODS)}")
+
+    # Optional multi-method ensemble: true for every method, a list, or
+    # a single method name
+    ensemble = data.get('ensemble') or []
+    if ensemble is True:
+        ensemble = list(METHODS)
+    elif isinstance(ensemble, str):
+        ensemble = [ensemble]
+    elif not isinstance(ensemble, list):
+        raise ValueError("ensemble must be true, a method name or a list of method names")
+    ensemble = [str(m).lower() for m in ensemble]
+    for m in ensemble:
+        if m not in METHODS:
+            raise ValueError(f"unknown method {m!r} in ensemble")
+    consensus = str(data.get('consensus') or DEFAULT_CONSENSUS).lower()
+    if consensus not in CONSENSUS_RULES:
+        raise ValueError(f"unknown consensus rule {consensus!r}")
+
+    # Optional weight sampling: "dirichlet", "smaa" (or true for "smaa")
+    weight_model = data.get('weight_uncertainty') or None
+    if weight_model is True:
+        weight_model = "smaa"
+    if weight_model is not None:
+        weight_model = str(weight_model).lower()
+        if weight_model not in WEIGHT_MODELS:
+            raise ValueError(f"unknown weight_uncertainty {weight_model!r}")
+    concentration = float(data.get('weight_concentration', WEIGHT_CONCENTRATION))
+    if not math.isfinite(concentration) or concentration <= 0:
+        raise ValueError("weight_concentration must be a positive number")
+    if ensemble and (prefilter or weight_model):
+        # The ensemble is scored on the main simulation's draws, which must
+        # cover every option with fixed weights
+        raise ValueError("ensemble can't be combined with prefilter or weight_uncertainty")
+
+    # Extract priorities — default to position order if not provided
+    priorities = [int(c.get('priority', i + 1)) for i, c in enumerate(criteria_data)]
+    priority_counts = Counter(priorities)
+
+    # Assign weights using tied-aware ROC
+    weights = engine.calculate_roc_weights_with_ties(priorities)
+
+    criteria = []
+    for i, c in enumerate(criteria_data):
+        if c.get('noise') is not None and not c['dynamic']:
+            raise ValueError(f"criterion {c['name']!r} has a noise spec but is not dynamic")
+        criteria.append({
+            "id":       f"c{i}",
+            "name":     c['name'],
+            "type":     c['type'],
+            "dynamic":  c['dynamic'],
+            "priority": priorities[i],
+            "tied":     priority_counts[priorities[i]] > 1,
+            "weight":   weights[i],
+            "noise":    parse_noise(c.get('noise')),
         })
 
-    return jsonify({
-        "goal": goal,
+    names = [o['name'] for o in options_data]
+    values = [[engine._to_float(v) for v in o['values']] for o in options_data]
+    # keep exactly what the user typed
+    raw_values = [[str(v).strip() for v in o['values']] for o in options_data]
+    problem = DecisionProblem(names, criteria, values)
+
+    return {
+        "goal":          goal,
+        "problem":       problem,
+        "raw_values":    raw_values,
+        "draws":         max_draws,
+        "precision":     precision,
+        "seed":          seed,
+        "prefilter":     prefilter,
+        "rank_stats":    rank_stats,
+        "sensitivity":   sensitivity,
+        "rank_reversal": rank_reversal,
+        "method":        method,
+        "ensemble":      ensemble,
+        "consensus":     consensus,
+        "weight_model":  weight_model,
+        "concentration": concentration,
+    }
+
+
+def analyze_decision(engine, decision, simulated=None, lazy=False, ensemble_tally=None):
+    """
+    Simulation, explanation and report stages for a parsed decision.
+
+    `simulated` is an optional (results, stats, elapsed_ms) triple from a
+    simulation already run elsewhere, e.g. stacked with other decisions,
+    and `ensemble_tally` that run's ensemble tally if it scored one.
+    With `lazy`, option_breakdown is a generator and the report timing only
+    covers the winner reasoning. A decision with `sensitivity` also gets
+    the winner's weight-stability intervals (see `stability_report`), and
+    one with `rank_reversal` a top-k reversal audit (`reversal_report`).
+    """
+    # The problem is read-only, so every stage shares this one instance
+    problem = decision['problem']
+    criteria = problem.criteria
+
+    t0 = time.perf_counter()
+    if simulated is None:
+        # Any ensemble is scored on the same draw tensors as the main method
+        for final in engine.simulate_progress(problem, decision['draws'],
+                                              decision['precision'],
+                                              seed=decision['seed'],
+                                              prefilter=decision['prefilter'],
+                                              rank_stats=decision['rank_stats'],
+                                              method=decision['method'],
+                                              weight_model=decision['weight_model'],
+                                              concentration=decision['concentration'],
+                                              ensemble=decision['ensemble'],
+                                              consensus=decision['consensus']):
+            pass
+        sim, sim_stats, ensemble_tally = final['results'], final['stats'], final['ensemble']
+        sim_ms = (time.perf_counter() - t0) * 1000
+    else:
+        sim, sim_stats, sim_ms = simulated
+    t1 = time.perf_counter()
+    gaps, order = engine.gap_matrix(problem)
+    t2 = time.perf_counter()
+    reasoning, breakdown = build_report(engine, sim, problem, gaps, order,
+                                        decision['raw_values'], lazy)
+    t3 = time.perf_counter()
+    timings = {
+        "simulate": round(sim_ms, 2),
+        "explain":  round((t2 - t1) * 1000, 2),
+        "report":   round((t3 - t2) * 1000, 2),
+    }
+
+    result = {
+        "goal":   decision['goal'],
+        "method": decision['method'],
         "criteria": [
             {
                 "name":     c['name'],
@@ -307,14 +2167,427 @@ def analyze():
                 "dynamic":  c['dynamic'],
                 "priority": c['priority'],
                 "tied":     c['tied'],
-                "weight":   round(c['weight'] * 100, 2)
+                "weight":   round(c['weight'] * 100, 2),
+                "noise":    c['noise'],
             }
             for c in criteria
         ],
         "simulation_results": sim,
+        "simulation":         sim_stats,
         "reasoning":          reasoning,
         "option_breakdown":   breakdown,
-    })
+        "timings_ms":         timings,
+    }
+    if decision.get('sensitivity'):
+        result['sensitivity'] = stability_report(engine, problem, decision['method'])
+        timings['sensitivity'] = round((time.perf_counter() - t3) * 1000, 2)
+    if decision.get('rank_reversal'):
+        t4 = time.perf_counter()
+        result['rank_reversal'] = reversal_report(engine, problem, decision['rank_reversal'])
+        timings['rank_reversal'] = round((time.perf_counter() - t4) * 1000, 2)
+    if decision.get('ensemble'):
+        t5 = time.perf_counter()
+        # Without a tally from the main run, a separate run with its seed and
+        # draw count (after any early stop) regenerates the same draws
+        result['ensemble'] = ensemble_report(engine, decision, sim_stats['seed'],
+                                             sim_stats['draws'], ensemble_tally)
+        timings['ensemble'] = round((time.perf_counter() - t5) * 1000, 2)
+    return result
+
+
+def ensemble_report(engine, decision, seed, draws, tally=None):
+    """
+    Consensus of the decision's ensemble methods over `draws` draws, sorted
+    by mean consensus score. Each method's confidences match a plain
+    simulation of that method with the same `seed` and draw count.
+
+    `tally` is the ensemble tally of the main simulation; without one the
+    ensemble is simulated here (see `simulate_ensemble`).
+    """
+    problem = decision['problem']
+    methods = decision['ensemble']
+    seed_seq = engine.seed_sequence(seed)
+    if tally is None:
+        tally = engine.simulate_ensemble(problem, methods, draws, seed=seed_seq,
+                                         rule=decision['consensus'])
+    consensus_wins = tally['consensus_wins']
+    consensus_mean = tally['consensus_sum'] / draws
+
+    per_method = (tally['wins'] * 100 / draws).round(1).T.tolist()
+    rows = [
+        {
+            "name":       name,
+            "score":      round(score, 4),
+            "confidence": round(c * 100 / draws, 1),
+            "methods":    dict(zip(methods, confidence)),
+        }
+        for name, score, c, confidence in zip(problem.names, consensus_mean.tolist(),
+                                              consensus_wins.tolist(), per_method)
+    ]
+    return {
+        "methods":   methods,
+        "consensus": decision['consensus'],
+        "draws":     draws,
+        "seed":      seed_seq.entropy,
+        "results":   sorted(rows, key=lambda r: r['score'], reverse=True),
+    }
+
+
+def reversal_report(engine, problem, top_k):
+    """Rank-reversal audit of the TOPSIS top-k (whatever the scoring method), by option name."""
+    order, checked, reversals = engine.rank_reversals(problem, top_k)
+    names = problem.names
+    top_k = min(top_k, max(len(names) - 1, 0))
+    return {
+        "method":    "topsis",
+        "top_k":     top_k,
+        "top":       [names[i] for i in order[:top_k].tolist()],
+        "checked":   checked,
+        "reversals": [
+            {"removed": names[row], "top": [names[i] for i in top]}
+            for row, top in reversals
+        ],
+    }
+
+
+def stability_report(engine, problem, method=DEFAULT_METHOD):
+    """
+    Weight-stability intervals for the winner under `method`, in the same
+    percent units as the criteria weights.
+    """
+    winner, intervals = engine.weight_stability(problem, method=method)
+    name_of = lambda row: None if row is None else problem.names[row]
+    return {
+        "winner": problem.names[winner],
+        "criteria": [
+            {
+                "name":        c['name'],
+                "weight":      round(c['weight'] * 100, 2),
+                "lower":       round(lower * 100, 2),
+                "upper":       round(upper * 100, 2),
+                "lower_rival": name_of(lower_rival),
+                "upper_rival": name_of(upper_rival),
+            }
+            for c, (lower, upper, lower_rival, upper_rival) in zip(problem.criteria, intervals)
+        ],
+    }
+
+
+def stream_analysis(engine, decision):
+    """
+    NDJSON form of /analyze for a parsed decision: a summary line with the
+    winner, reasoning and simulation stats, then one option_breakdown
+    record per line. Records are built and serialized one at a time
+    instead of as a single list.
+    """
+    result = analyze_decision(engine, decision, lazy=True)
+
+    breakdown = result.pop('option_breakdown')
+    sim = result.pop('simulation_results')
+    result['winner'] = sim[0]
+    result['options'] = len(sim)
+    del sim   # the records below only need the breakdown generator
+    yield app.json.dumps(result).encode("utf-8") + b"\n"
+
+    for entry in breakdown:
+        yield app.json.dumps(entry).encode("utf-8") + b"\n"
+
+
+def run_group(data):
+    """
+    /analyze/group: one decision scored under every participant's
+    priorities, on the options' base values (no simulation).
+
+    `participants` is a list of priority lists in criteria order, or of
+    {"name": ..., "priorities": list or {criterion name: priority}}
+    dicts; criteria missing from a dict keep the payload's priority.
+    Weights for all participants come from one bulk ROC computation and
+    all scores from one `group_scores` call. The aggregate ranks options
+    by the `consensus` rule over participants' rankings and also reports
+    each option's share of participant votes and its score under the mean
+    weights.
+    """
+    engine = DecisionEngine()
+    t0 = time.perf_counter()
+    decision = parse_decision(engine, data)
+    problem = decision['problem']
+    criteria = problem.criteria
+
+    labels, rows = [], []
+    for i, entry in enumerate(data['participants']):
+        label, priorities = f"participant {i + 1}", entry
+        if isinstance(entry, dict):
+            label = entry.get('name', label)
+            priorities = entry['priorities']
+        if isinstance(priorities, dict):
+            priorities = [priorities.get(c['name'], c['priority']) for c in criteria]
+        if len(priorities) != len(criteria):
+            raise ValueError(f"{label}: expected {len(criteria)} priorities")
+        labels.append(label)
+        rows.append([int(p) for p in priorities])
+    if not rows:
+        raise ValueError("at least one participant is required")
+
+    weights = engine.roc_weights_bulk(np.array(rows, dtype=np.int64))
+    t1 = time.perf_counter()
+    scores = engine.group_scores(problem, weights, decision['method'])
+    winners = scores.argmax(axis=0)
+    votes = np.bincount(winners, minlength=len(problem)) * 100 / len(labels)
+    consensus = engine.consensus_scores(scores.T, decision['consensus'])
+    mean_weight = weights.mean(axis=0)
+    pooled = engine.group_scores(problem, mean_weight[None], decision['method'])[:, 0]
+    t2 = time.perf_counter()
+
+    results = sorted(
+        (
+            {
+                "name":         name,
+                "score":        round(c, 4),
+                "votes":        round(v, 1),
+                "pooled_score": round(p, 4),
+            }
+            for name, c, v, p in zip(problem.names, consensus.tolist(), votes.tolist(),
+                                     pooled.tolist())
+        ),
+        key=lambda r: r['score'], reverse=True,
+    )
+    return {
+        "goal":      decision['goal'],
+        "method":    decision['method'],
+        "consensus": decision['consensus'],
+        "criteria": [
+            {
+                "name":       c['name'],
+                "type":       c['type'],
+                "weight":     round(w * 100, 2),
+                "weight_min": round(lo * 100, 2),
+                "weight_max": round(hi * 100, 2),
+            }
+            for c, w, lo, hi in zip(criteria, mean_weight.tolist(),
+                                    weights.min(axis=0).tolist(),
+                                    weights.max(axis=0).tolist())
+        ],
+        "winner":       results[0]['name'],
+        "results":      results,
+        "participants": [
+            {"name": label, "winner": problem.names[w], "score": round(s, 4)}
+            for label, w, s in zip(labels, winners.tolist(),
+                                   scores.max(axis=0).tolist())
+        ],
+        "timings_ms": {
+            "weights": round((t1 - t0) * 1000, 2),
+            "score":   round((t2 - t1) * 1000, 2),
+        },
+    }
+
+
+def sse_event(event, payload):
+    """One Server-Sent Events frame; `payload` is a dict or serialized JSON bytes."""
+    if not isinstance(payload, bytes):
+        payload = app.json.dumps(payload).encode("utf-8")
+    return b"event: " + event.encode("ascii") + b"\ndata: " + payload + b"\n\n"
+
+
+def stream_progress(data):
+    """
+    Server-Sent Events for one decision.
+
+    Emits a `progress` event after every simulation chunk with the draws so
+    far, the margin on the leader and the current top confidences, then a
+    `result` event with the full /analyze response. If the client goes
+    away, the server closes this generator at its next yield, which also
+    closes the simulation so no further chunks are computed.
+    """
+    engine = DecisionEngine()
+    try:
+        key = result_cache.make_key(data)
+        body = result_cache.get(key)
+        if body is not None:
+            yield sse_event("result", body)
+            return
+
+        decision = parse_decision(engine, data)
+        problem = decision['problem']
+        t0 = time.perf_counter()
+        run = engine.simulate_progress(problem, decision['draws'], decision['precision'],
+                                       seed=decision['seed'],
+                                       prefilter=decision['prefilter'],
+                                       rank_stats=decision['rank_stats'],
+                                       method=decision['method'],
+                                       weight_model=decision['weight_model'],
+                                       concentration=decision['concentration'],
+                                       ensemble=decision['ensemble'],
+                                       consensus=decision['consensus'])
+        try:
+            for progress in run:
+                if progress.get('done'):
+                    break
+                table = engine.confidence_table(problem.names, progress['counts'],
+                                                progress['draws'])
+                yield sse_event("progress", {
+                    "draws":   progress['draws'],
+                    "margin":  round(progress['margin'] * 100, 2),
+                    "results": table[:PROGRESS_TOP],
+                })
+        finally:
+            run.close()
+
+        simulated = (progress['results'], progress['stats'],
+                     (time.perf_counter() - t0) * 1000)
+        result = analyze_decision(engine, decision, simulated,
+                                  ensemble_tally=progress['ensemble'])
+        body = app.json.dumps(result).encode("utf-8")
+        result_cache.put(key, body)
+        yield sse_event("result", body)
+    except Exception as exc:
+        yield sse_event("error", {"error": f"{type(exc).__name__}: {exc}"})
+
+
+def stack_key(decision):
+    """
+    Decisions with equal keys can share one stacked simulation; None means
+    the decision needs the general path (adaptive stopping, skyline, rank
+    statistics, sampled weights, custom noise models or an ensemble, which
+    is scored on the decision's own draws).
+    """
+    if (decision['precision'] is not None or decision['prefilter']
+            or decision['rank_stats'] or decision['weight_model'] or decision['ensemble']
+            or any(c['noise'] for c in decision['problem'].criteria)):
+        return None
+    return (
+        decision['problem'].values.shape,
+        tuple(decision['problem'].dynamic.tolist()),
+        decision['draws'],
+        decision['method'],
+    )
+
+
+def batch_line(index, body=None, error=None):
+    """One NDJSON record; `body` is an already serialized result."""
+    if error is not None:
+        return app.json.dumps({"index": index, "error": error}).encode("utf-8") + b"\n"
+    return b'{"index":%d,"result":' % index + body + b"}\n"
+
+
+def stream_batch(items):
+    """
+    Yield NDJSON records for a list of decision payloads as they finish.
+
+    Cached decisions are answered first; the rest are grouped by
+    `stack_key` and each group is simulated as one stacked array
+    computation. A failing item only produces an error record.
+    """
+    engine = DecisionEngine()
+    groups = OrderedDict()  # {stack key or ("single", index): [(index, cache key, decision)]}
+
+    for index, data in enumerate(items):
+        try:
+            key = result_cache.make_key(data)
+            body = result_cache.get(key)
+            if body is not None:
+                yield batch_line(index, body)
+                continue
+            decision = parse_decision(engine, data)
+        except Exception as exc:
+            yield batch_line(index, error=f"{type(exc).__name__}: {exc}")
+            continue
+        group = stack_key(decision) or ("single", index)
+        groups.setdefault(group, []).append((index, key, decision))
+
+    def finish(index, key, decision, simulated=None):
+        try:
+            body = app.json.dumps(analyze_decision(engine, decision, simulated)).encode("utf-8")
+        except Exception as exc:
+            return batch_line(index, error=f"{type(exc).__name__}: {exc}")
+        result_cache.put(key, body)
+        return batch_line(index, body)
+
+    for members in groups.values():
+        simulated = [None] * len(members)
+        if len(members) > 1:
+            try:
+                t0 = time.perf_counter()
+                problems = [d['problem'] for _, _, d in members]
+                runs = engine.simulate_stacked(problems, members[0][2]['draws'],
+                                               [d['seed'] for _, _, d in members],
+                                               members[0][2]['method'])
+                elapsed = (time.perf_counter() - t0) * 1000
+                simulated = [(sim, stats, elapsed) for sim, stats in runs]
+            except Exception:
+                # Fall back to simulating members one by one
+                pass
+        for (index, key, decision), sim in zip(members, simulated):
+            yield finish(index, key, decision, sim)
+
+
+@app.route("/analyze/events", methods=["POST"])
+def analyze_events():
+    response = app.response_class(stream_progress(request.json),
+                                  mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/analyze/group", methods=["POST"])
+def analyze_group():
+    try:
+        return jsonify(run_group(request.json))
+    except (KeyError, ValueError, TypeError) as exc:
+        return bad_request(exc)
+
+
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    data = request.json
+    items = data.get('decisions') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return bad_request(ValueError(
+            "expected a list of decisions or an object with a 'decisions' list"))
+    return app.response_class(stream_batch(items), mimetype="application/x-ndjson")
+
+
+@app.route("/whatif", methods=["POST"])
+def whatif_start():
+    """
+    Open a what-if session for an /analyze payload. Sessions live in this
+    process only; on a 404 from the update route, open a new one.
+    """
+    engine = DecisionEngine()
+    try:
+        decision = parse_decision(engine, request.json)
+    except (KeyError, ValueError, TypeError) as exc:
+        return bad_request(exc)
+    session = WhatIfSession(engine, decision)
+    session_id = secrets.token_urlsafe(16)
+    whatif_sessions.put(session_id, session)
+    return jsonify(session.analysis(session_id))
+
+
+@app.route("/whatif/<session_id>", methods=["POST"])
+def whatif_update(session_id):
+    """Apply {"changes": [...], "priorities": {...}} (see WhatIfSession.apply)."""
+    session = whatif_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "unknown or expired what-if session"}), 404
+
+    data = request.json or {}
+    with session.lock:
+        try:
+            session.apply(data.get('changes', []), data.get('priorities'))
+        except (KeyError, ValueError, TypeError) as exc:
+            return bad_request(exc)
+        result = session.analysis(session_id)
+    # Re-inserting refreshes the session's TTL and LRU position
+    whatif_sessions.put(session_id, session)
+    return jsonify(result)
+
+
+@app.route("/whatif/<session_id>", methods=["DELETE"])
+def whatif_close(session_id):
+    if not whatif_sessions.discard(session_id):
+        return jsonify({"error": "unknown or expired what-if session"}), 404
+    return "", 204
 
 
 app = app
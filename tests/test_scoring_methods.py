@@ -0,0 +1,128 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from index import DecisionEngine, METHODS, app  # noqa: E402
+
+
+def reference_scores(method, X, w, benefit):
+    """Straightforward per-option implementations of each scoring method."""
+    n, k = X.shape
+    hi, lo = X.max(axis=0), X.min(axis=0)
+
+    if method == "topsis":
+        den = [np.sqrt(sum(X[i, j] ** 2 for i in range(n))) or 1.0 for j in range(k)]
+        V = [[X[i, j] / den[j] * w[j] for j in range(k)] for i in range(n)]
+        best = [max(V[i][j] for i in range(n)) if benefit[j] else min(V[i][j] for i in range(n))
+                for j in range(k)]
+        worst = [min(V[i][j] for i in range(n)) if benefit[j] else max(V[i][j] for i in range(n))
+                 for j in range(k)]
+        out = []
+        for i in range(n):
+            d1 = np.sqrt(sum((V[i][j] - best[j]) ** 2 for j in range(k)))
+            d2 = np.sqrt(sum((V[i][j] - worst[j]) ** 2 for j in range(k)))
+            out.append(0.5 if d1 + d2 == 0 else d2 / (d1 + d2))
+        return np.array(out)
+
+    r = np.zeros((n, k))
+    for i in range(n):
+        for j in range(k):
+            span = hi[j] - lo[j]
+            good = X[i, j] - lo[j] if benefit[j] else hi[j] - X[i, j]
+            r[i, j] = 1.0 if span == 0 else good / span
+
+    if method == "wsm":
+        return np.array([sum(r[i, j] * w[j] for j in range(k)) for i in range(n)])
+
+    if method == "vikor":
+        S = np.array([sum((1 - r[i, j]) * w[j] for j in range(k)) for i in range(n)])
+        R = np.array([max((1 - r[i, j]) * w[j] for j in range(k)) for i in range(n)])
+
+        def scaled(x):
+            return np.zeros_like(x) if x.max() == x.min() else (x - x.min()) / (x.max() - x.min())
+        return 1 - (0.5 * scaled(S) + 0.5 * scaled(R))
+
+    if method == "wpm":
+        Y = X + np.where(lo > 0, 0, 1 - lo)
+        out = np.ones(n)
+        for i in range(n):
+            for j in range(k):
+                ratio = Y[i, j] / Y[:, j].max() if benefit[j] else Y[:, j].min() / Y[i, j]
+                out[i] *= ratio ** w[j]
+        return out
+
+    if method == "promethee":
+        def better(a, c, j):
+            return int(X[a, j] > X[c, j] if benefit[j] else X[a, j] < X[c, j])
+        phi = np.zeros(n)
+        for a in range(n):
+            for c in range(n):
+                if a != c:
+                    phi[a] += sum(w[j] * (better(a, c, j) - better(c, a, j)) for j in range(k))
+        return phi / (n - 1)
+
+    raise ValueError(method)
+
+
+class ScoringMethodTests(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = DecisionEngine()
+        self.rng = np.random.default_rng(0)
+
+    def random_problem(self):
+        n, k = self.rng.integers(2, 9), self.rng.integers(1, 5)
+        X = self.rng.integers(-2, 10, (n, k)).astype(float)
+        w = self.rng.random(k)
+        return X, w / w.sum(), self.rng.random(k) < 0.5
+
+    def test_scores_match_reference(self):
+        for _ in range(100):
+            X, w, benefit = self.random_problem()
+            for method in METHODS:
+                with self.subTest(method=method, X=X.tolist()):
+                    got = self.engine.score_matrix(X, w, benefit, method=method)
+                    np.testing.assert_allclose(got, reference_scores(method, X, w, benefit),
+                                               atol=1e-12)
+
+    def test_batched_and_fixed_rows(self):
+        for _ in range(50):
+            X, w, benefit = self.random_problem()
+            for method in METHODS:
+                with self.subTest(method=method, X=X.tolist()):
+                    batched = self.engine.score_matrix(np.stack([X, X[::-1]]), w, benefit,
+                                                       method=method)
+                    np.testing.assert_allclose(batched[1],
+                                               reference_scores(method, X[::-1], w, benefit),
+                                               atol=1e-12)
+                    if len(X) > 2:
+                        # Fixed rows feed the normalization but are not scored
+                        partial = self.engine.score_matrix(X[:2], w, benefit, X[2:],
+                                                           method=method)
+                        np.testing.assert_allclose(partial,
+                                                   reference_scores(method, X, w, benefit)[:2],
+                                                   atol=1e-12)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            self.engine.score_matrix(np.ones((2, 2)), np.ones(2) / 2, np.ones(2, bool),
+                                     method="electre")
+
+    def test_analyze_rejects_unknown_method(self):
+        payload = {
+            "goal": "g",
+            "method": "electre",
+            "criteria": [{"name": "a", "type": "benefit"}],
+            "options": [{"name": "x", "values": ["1"]}, {"name": "y", "values": ["2"]}],
+        }
+        response = app.test_client().post("/analyze", json=payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("unknown method", response.get_json()['error'])
+
+
+if __name__ == "__main__":
+    unittest.main()